@@ -0,0 +1,132 @@
+"""
+Times FOR loops of a million iterations in every execution mode, both in
+this tree and in an older revision checked out into a temporary git
+worktree, and prints the speedup. By default the older revision is the one
+before FOR loops counted with a native range.
+
+    python benchmarks/for_loops.py [iterations] [--against REV]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROGRAMS = {
+    # Top level loop in statement context, counter kept in the symbol table
+    "statement": "VAR t = 0\nFOR i = 0 TO {n} THEN\nVAR t = t + i\nEND\nt",
+    # Same loop inside a function, where the VM keeps the counter in a slot
+    "function": (
+        "FUN total(n)\nVAR t = 0\nFOR i = 0 TO n THEN\nVAR t = t + i\nEND\n"
+        "RETURN t\nEND\ntotal({n})"
+    ),
+    # Loop used as an expression. Its list may be lazy, and APPEND needs a
+    # list of its own, so every body value is computed either way.
+    "expression": "VAR l = FOR i = 0 TO {n} THEN i * 2\nAPPEND(l, 0)\n0",
+}
+MODES = ["ast", "fast", "closure", "python", "vm"]
+REPEAT = 3
+
+
+def time_program(runner, text, mode):
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        _, error = runner.run("<benchmark>", text, mode=mode)
+        elapsed = time.perf_counter() - start
+        if error:
+            raise Exception(error.as_string())
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def time_tree(tree, iterations):
+    """The times of every program in every mode, run by the interpreter in tree"""
+    sys.path.insert(0, tree)
+    from runtime import runner
+
+    return {
+        name: [
+            time_program(runner, program.format(n=iterations), mode) for mode in MODES
+        ]
+        for name, program in PROGRAMS.items()
+    }
+
+
+def git(*args):
+    return subprocess.run(
+        ["git", *args], cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout
+
+
+def baseline_revision():
+    # The parent of the commit that added for_range
+    return (
+        git(
+            "log",
+            "--reverse",
+            "--format=%H",
+            "-S",
+            "def for_range",
+            "--",
+            "runtime/interpreter.py",
+        ).split()[0]
+        + "^"
+    )
+
+
+def time_revision(revision, iterations):
+    with tempfile.TemporaryDirectory() as directory:
+        tree = os.path.join(directory, "tree")
+        git("worktree", "add", "--detach", tree, revision)
+        try:
+            output = subprocess.run(
+                [sys.executable, __file__, str(iterations), "--tree", tree],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout
+        finally:
+            git("worktree", "remove", "--force", tree)
+    return json.loads(output)
+
+
+def print_row(label, values, unit):
+    print(f"{label:20}" + "".join(f"{value:>9.2f}{unit}" for value in values))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("iterations", nargs="?", type=int, default=1000000)
+    parser.add_argument("--against", help="revision to compare with")
+    parser.add_argument("--tree", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.tree:
+        # Run by time_revision inside the older worktree
+        print(json.dumps(time_tree(args.tree, args.iterations)))
+        return
+
+    revision = args.against or baseline_revision()
+    baseline = time_revision(revision, args.iterations)
+    current = time_tree(ROOT, args.iterations)
+
+    print(f"baseline: {revision}")
+    print(f"{'':20}" + "".join(f"{mode:>10}" for mode in MODES))
+    for name in PROGRAMS:
+        print_row(name + " baseline", baseline[name], "s")
+        print_row(name + " current", current[name], "s")
+        print_row(
+            name + " speedup",
+            [old / new for old, new in zip(baseline[name], current[name])],
+            "x",
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,412 @@
+from lexing.symbols import *
+from parsing.nodes import *
+from errors.error import RuntimeError
+from runtime.interpreter import RuntimeResult
+from runtime.interpreter import BINARY_OPERATIONS, operation_key, for_range
+from runtime.fast_interpreter import ReturnSignal, BreakSignal, ContinueSignal
+from runtime.transpiled import BasicError
+import runtime.types as types
+
+
+class CompiledClosure:
+    """
+    A tree of closures that return values directly. Errors, RETURN, BREAK
+    and CONTINUE are raised as in the FastInterpreter and turned back into
+    a RuntimeResult here.
+    """
+
+    def __init__(self, name, closure, is_function):
+        self.name = name
+        self.closure = closure
+        self.is_function = is_function
+
+    def run(self, context):
+        res = RuntimeResult()
+        try:
+            value = self.closure(context)
+        except BasicError as e:
+            return res.failure(e.error)
+        except ReturnSignal as signal:
+            if self.is_function:
+                return res.success_return(signal.value)
+            return res.success(None)
+        except (BreakSignal, ContinueSignal):
+            return res.success(types.Number.null if self.is_function else None)
+        return res.success(value)
+
+    def __repr__(self):
+        return f"<closure {self.name}>"
+
+
+class ClosureCompiler:
+    def compile(self, node, name="<program>"):
+        return CompiledClosure(name, self.visit(node), False)
+
+    def compile_function(self, node, name):
+        if node.should_auto_return:
+            return CompiledClosure(name, self.visit(node.body_node), True)
+        return CompiledClosure(name, self.visit_discarded(node.body_node), True)
+
+    def visit(self, node):
+        method_name = f"visit_{type(node).__name__}"
+        method = getattr(self, method_name, self.no_visit_method)
+        return method(node)
+
+    def no_visit_method(self, node):
+        raise Exception(f"No visit_{type(node).__name__} method defined")
+
+    def visit_discarded(self, node):
+        if not isinstance(node, ListNode):
+            return self.visit(node)
+
+        statements = [self.visit(element_node) for element_node in node.element_nodes]
+
+        def discarded_statements(context):
+            for statement in statements:
+                statement(context)
+            return types.Number.null
+
+        return discarded_statements
+
+    def visit_body(self, node, should_return_null):
+        if should_return_null:
+            return self.visit_discarded(node)
+        return self.visit(node)
+
+    def literal_value(self, node):
+        """The shared value of a number or string node, or None"""
+        if isinstance(node, NumberNode):
+            return types.make_number(node.tok.value).share()
+        if isinstance(node, StringNode):
+            return types.String(node.tok.value).share()
+        return None
+
+    def visit_NumberNode(self, node):
+        value = self.literal_value(node)
+        return lambda context: value
+
+    def visit_StringNode(self, node):
+        value = self.literal_value(node)
+        return lambda context: value
+
+    def visit_ListNode(self, node):
+        elements = [self.visit(element_node) for element_node in node.element_nodes]
+        pos_start, pos_end = node.pos_start, node.pos_end
+
+        def list_(context):
+            values = [element(context) for element in elements]
+            return types.List(values).set_context(context).set_pos(pos_start, pos_end)
+
+        return list_
+
+    def visit_MapNode(self, node):
+        entries = [
+            (self.visit(key_node), self.visit(value_node))
+            for key_node, value_node in node.entry_nodes
+        ]
+        pos_start, pos_end = node.pos_start, node.pos_end
+
+        def map_(context):
+            pairs = [
+                (key_operand(context), value_operand(context))
+                for key_operand, value_operand in entries
+            ]
+            value, error = types.make_map(pairs)
+            if error:
+                raise BasicError(error.locate(pos_start, pos_end, context))
+            return value.set_context(context).set_pos(pos_start, pos_end)
+
+        return map_
+
+    def visit_SliceNode(self, node):
+        operand = self.visit(node.node)
+        bound_operands = [
+            None if bound_node is None else self.visit(bound_node)
+            for bound_node in (node.start_node, node.end_node)
+        ]
+        pos_start, pos_end = node.pos_start, node.pos_end
+
+        def slice_(context):
+            value = operand(context)
+            bounds = [
+                None if bound_operand is None else bound_operand(context)
+                for bound_operand in bound_operands
+            ]
+            result, error = value.sliced(*bounds)
+            if error:
+                raise BasicError(error.locate(pos_start, pos_end, context))
+            return result
+
+        return slice_
+
+    def visit_UnaryOperationNode(self, node):
+        operand = self.visit(node.node)
+        pos_start, pos_end = node.pos_start, node.pos_end
+
+        if node.op_tok.type == TT_MINUS:
+
+            def unary_operation(context):
+                number, error = operand(context).multiplied_by(-1)
+                if error:
+                    raise BasicError(error.locate(pos_start, pos_end, context))
+                return number
+
+        elif node.op_tok.matches(TT_KEYWORD, "NOT"):
+
+            def unary_operation(context):
+                number, error = operand(context).notted()
+                if error:
+                    raise BasicError(error.locate(pos_start, pos_end, context))
+                return number
+
+        else:
+            return operand
+
+        return unary_operation
+
+    def visit_BinaryOperationNode(self, node):
+        left_operand = self.visit(node.left_node)
+        method_name = BINARY_OPERATIONS[operation_key(node.op_tok)]
+        pos_start, pos_end = node.pos_start, node.pos_end
+
+        # A literal right operand, as in n - 1 or n < 2, is read straight
+        # from the closure instead of through a call
+        right_value = self.literal_value(node.right_node)
+        if right_value is not None:
+
+            def binary_operation(context):
+                result, error = getattr(left_operand(context), method_name)(
+                    right_value
+                )
+                if error:
+                    raise BasicError(error.locate(pos_start, pos_end, context))
+                return result
+
+            return binary_operation
+
+        right_operand = self.visit(node.right_node)
+
+        def binary_operation(context):
+            left = left_operand(context)
+            result, error = getattr(left, method_name)(right_operand(context))
+            if error:
+                raise BasicError(error.locate(pos_start, pos_end, context))
+            return result
+
+        return binary_operation
+
+    def visit_VarAccessNode(self, node):
+        var_name = node.var_name_tok.value
+        pos_start, pos_end = node.pos_start, node.pos_end
+
+        def var_access(context):
+            value = context.symbol_table.get(var_name)
+            if value is None:
+                raise BasicError(
+                    RuntimeError(
+                        pos_start, pos_end, f"'{var_name}' is not defined", context
+                    )
+                )
+            return value
+
+        return var_access
+
+    def visit_VarAssignNode(self, node):
+        var_name = node.var_name_tok.value
+        value_operand = self.visit(node.value_node)
+
+        def var_assign(context):
+            value = value_operand(context)
+            context.symbol_table.set(var_name, value)
+            return value
+
+        return var_assign
+
+    def visit_IfNode(self, node):
+        cases = [
+            (self.visit(condition), self.visit_body(expr, should_return_null))
+            for condition, expr, should_return_null in node.cases
+        ]
+        else_case = self.visit_body(*node.else_case) if node.else_case else None
+        null_cases = [should_return_null for _, _, should_return_null in node.cases]
+        else_is_null = node.else_case[1] if node.else_case else True
+
+        def if_(context):
+            for (condition, expr), should_return_null in zip(cases, null_cases):
+                if condition(context).is_true():
+                    expr_value = expr(context)
+                    return types.Number.null if should_return_null else expr_value
+
+            if else_case:
+                else_value = else_case(context)
+                return types.Number.null if else_is_null else else_value
+
+            return types.Number.null
+
+        return if_
+
+    def visit_ForNode(self, node):
+        start_operand = self.visit(node.start_val_node)
+        end_operand = self.visit(node.end_val_node)
+        step_operand = self.visit(node.step_val_node) if node.step_val_node else None
+        body = self.visit_body(node.body_node, node.should_return_null)
+        var_name = node.var_name_tok.value
+        should_return_null = node.should_return_null
+        is_lazy = node.is_lazy
+        pos_start, pos_end = node.pos_start, node.pos_end
+
+        def for_(context):
+            elements = []
+            start_value = start_operand(context)
+            end_value = end_operand(context)
+            step = step_operand(context).value if step_operand else 1
+
+            symbols = context.symbol_table.symbols
+            if is_lazy:
+                elements = types.lazy_list(
+                    start_value.value, end_value.value, step, var_name, body
+                )
+                if elements.counter:
+                    symbols[var_name] = types.make_number(elements.counter[-1])
+                return elements.set_context(context).set_pos(pos_start, pos_end)
+
+            for i in for_range(start_value.value, end_value.value, step):
+                symbols[var_name] = types.make_number(i)
+                try:
+                    value = body(context)
+                except ContinueSignal:
+                    continue
+                except BreakSignal:
+                    break
+                if not should_return_null:
+                    elements.append(value)
+
+            if should_return_null:
+                return types.Number.null
+            return types.List(elements).set_context(context).set_pos(pos_start, pos_end)
+
+        return for_
+
+    def visit_ForEachNode(self, node):
+        iterable_operand = self.visit(node.iterable_node)
+        body = self.visit_body(node.body_node, node.should_return_null)
+        var_name = node.var_name_tok.value
+        should_return_null = node.should_return_null
+        iterable_start, iterable_end = (
+            node.iterable_node.pos_start,
+            node.iterable_node.pos_end,
+        )
+        pos_start, pos_end = node.pos_start, node.pos_end
+
+        def for_each(context):
+            elements = []
+            values, error = iterable_operand(context).iterate()
+            if error:
+                raise BasicError(error.locate(iterable_start, iterable_end, context))
+
+            symbols = context.symbol_table.symbols
+            for element in values:
+                symbols[var_name] = element
+                try:
+                    value = body(context)
+                except ContinueSignal:
+                    continue
+                except BreakSignal:
+                    break
+                if not should_return_null:
+                    elements.append(value)
+
+            if should_return_null:
+                return types.Number.null
+            return types.List(elements).set_context(context).set_pos(pos_start, pos_end)
+
+        return for_each
+
+    def visit_WhileNode(self, node):
+        condition = self.visit(node.condition_node)
+        body = self.visit_body(node.body_node, node.should_return_null)
+        should_return_null = node.should_return_null
+        pos_start, pos_end = node.pos_start, node.pos_end
+
+        def while_(context):
+            elements = []
+
+            while condition(context).is_true():
+                try:
+                    value = body(context)
+                except ContinueSignal:
+                    continue
+                except BreakSignal:
+                    break
+                if not should_return_null:
+                    elements.append(value)
+
+            if should_return_null:
+                return types.Number.null
+            return types.List(elements).set_context(context).set_pos(pos_start, pos_end)
+
+        return while_
+
+    def visit_FunctionDefinitionNode(self, node):
+        func_name = node.var_name_tok.value if node.var_name_tok else None
+        arg_names = [arg_name.value for arg_name in node.arg_name_toks]
+        code = self.compile_function(node, func_name or "<anonymous>")
+        body_node = node.body_node
+        should_auto_return = node.should_auto_return
+        memo = node.memo
+        pos_start, pos_end = node.pos_start, node.pos_end
+
+        def function_definition(context):
+            func = (
+                types.Function(
+                    func_name, body_node, arg_names, should_auto_return, code, memo
+                )
+                .set_context(context)
+                .set_pos(pos_start, pos_end)
+            )
+            if func_name:
+                context.symbol_table.set(func_name, func)
+            return func
+
+        return function_definition
+
+    def visit_CallNode(self, node):
+        callee = self.visit(node.node_to_call)
+        arg_operands = [self.visit(arg_node) for arg_node in node.arg_nodes]
+        is_tail_call = node.is_tail_call
+        pos_start, pos_end = node.pos_start, node.pos_end
+
+        def call(context):
+            value_to_call = (
+                callee(context).copy().set_pos(pos_start, pos_end).set_context(context)
+            )
+            args = [arg_operand(context) for arg_operand in arg_operands]
+            if is_tail_call and isinstance(value_to_call, types.Function):
+                return types.TailCall(value_to_call, args)
+
+            res = value_to_call.execute(args)
+            if res.error:
+                raise BasicError(res.error)
+            return res.value
+
+        return call
+
+    def visit_ReturnNode(self, node):
+        operand = self.visit(node.node_to_return) if node.node_to_return else None
+
+        def return_(context):
+            raise ReturnSignal(operand(context) if operand else types.Number.null)
+
+        return return_
+
+    def visit_ContinueNode(self, node):
+        def continue_(context):
+            raise ContinueSignal()
+
+        return continue_
+
+    def visit_BreakNode(self, node):
+        def break_(context):
+            raise BreakSignal()
+
+        return break_
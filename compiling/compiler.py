@@ -0,0 +1,413 @@
+from lexing.symbols import *
+from parsing.nodes import *
+from compiling.opcodes import *
+from compiling.resolver import Resolver
+from runtime.interpreter import BINARY_OPERATIONS, operation_key
+import runtime.types as types
+import runtime.vm as vm
+
+
+STACK_EFFECTS = {
+    OP_LOAD_NUMBER: 1,
+    OP_LOAD_STRING: 1,
+    OP_LOAD_NULL: 1,
+    OP_LOAD_NAME: 1,
+    OP_STORE_NAME: 0,
+    OP_LOAD_FAST: 1,
+    OP_STORE_FAST: 0,
+    OP_BINARY_OP: -1,
+    OP_BINARY_NUMBER: -1,
+    OP_UNARY_MINUS: 0,
+    OP_UNARY_NOT: 0,
+    OP_LIST_APPEND: -1,
+    OP_POP: -1,
+    OP_JUMP: 0,
+    OP_JUMP_IF_FALSE: -1,
+    OP_FOR_PREP: -2,
+    OP_LAZY_LIST: -2,
+    OP_GET_ITER: 0,
+    OP_FOR_EACH_ITER: 0,
+    OP_FOR_ITER: 0,
+    OP_MAKE_FUNCTION: 1,
+    OP_RETURN_VALUE: -1,
+    OP_RETURN_FUNC: -1,
+    OP_RETURN_NONE: 0,
+}
+
+
+def stack_effect(op, arg):
+    if op == OP_BUILD_LIST:
+        return 1 - arg
+    if op == OP_BUILD_MAP:
+        return 1 - 2 * arg
+    if op == OP_SLICE:
+        return -sum(arg)
+    if op in (OP_CALL, OP_TAIL_CALL):
+        return -arg[0]
+    return STACK_EFFECTS[op]
+
+
+# Not a valid identifier, so no BASIC name can clash with it
+COUNTER_NAME = "<counter>"
+
+
+class Code:
+    def __init__(self, name, instructions, slot_names=None):
+        self.name = name
+        self.instructions = instructions
+        self.slot_names = slot_names
+
+    def run(self, context):
+        return vm.VM().run(self, context)
+
+    def disassemble(self):
+        lines = []
+        for index, (op, arg, _, _) in enumerate(self.instructions):
+            if isinstance(arg, Code):
+                arg = f"<code {arg.name}>"
+            elif isinstance(arg, tuple):
+                arg = ", ".join(
+                    f"<code {a.name}>" if isinstance(a, Code) else repr(a) for a in arg
+                )
+            lines.append(f"{index:4} {OPCODE_NAMES[op]:16} {'' if arg is None else arg}")
+        return "\n".join(lines)
+
+    def __repr__(self):
+        return f"<code {self.name}>"
+
+
+class Loop:
+    def __init__(self, continue_target, base_depth):
+        self.continue_target = continue_target
+        self.base_depth = base_depth
+        self.break_jumps = []
+
+
+class Compiler:
+    def __init__(self, name="<program>"):
+        self.name = name
+        self.instructions = []
+        self.depth = 0
+        self.loops = []
+        self.is_function = False
+
+    def compile(self, node):
+        Resolver().resolve(node)
+        self.visit(node)
+        self.emit(OP_RETURN_VALUE, None, node)
+        return Code(self.name, self.instructions)
+
+    def compile_function(self, node):
+        self.is_function = True
+        if node.should_auto_return:
+            self.visit(node.body_node)
+        else:
+            self.visit_discarded(node.body_node)
+            self.emit(OP_LOAD_NULL, None, node)
+        self.emit(OP_RETURN_VALUE, None, node)
+        return Code(self.name, self.instructions, node.slot_names)
+
+    def emit(self, op, arg=None, node=None):
+        pos_start = node.pos_start if node else None
+        pos_end = node.pos_end if node else None
+        self.instructions.append((op, arg, pos_start, pos_end))
+        self.depth += stack_effect(op, arg)
+        return len(self.instructions) - 1
+
+    def patch(self, index, arg):
+        op, _, pos_start, pos_end = self.instructions[index]
+        self.instructions[index] = (op, arg, pos_start, pos_end)
+
+    def patch_jump(self, index):
+        self.patch(index, len(self.instructions))
+
+    def visit(self, node):
+        method_name = f"visit_{type(node).__name__}"
+        method = getattr(self, method_name, self.no_visit_method)
+        return method(node)
+
+    def no_visit_method(self, node):
+        raise Exception(f"No visit_{type(node).__name__} method defined")
+
+    def visit_discarded(self, node):
+        if isinstance(node, ListNode):
+            for element_node in node.element_nodes:
+                self.visit(element_node)
+                self.emit(OP_POP, None, element_node)
+        else:
+            self.visit(node)
+            self.emit(OP_POP, None, node)
+
+    def visit_body(self, node, should_return_null):
+        if should_return_null:
+            self.visit_discarded(node)
+            self.emit(OP_LOAD_NULL, None, node)
+        else:
+            self.visit(node)
+
+    def visit_NumberNode(self, node):
+        self.emit(OP_LOAD_NUMBER, types.make_number(node.tok.value).share(), node)
+
+    def visit_StringNode(self, node):
+        self.emit(OP_LOAD_STRING, types.String(node.tok.value).share(), node)
+
+    def visit_ListNode(self, node):
+        for element_node in node.element_nodes:
+            self.visit(element_node)
+        self.emit(OP_BUILD_LIST, len(node.element_nodes), node)
+
+    def visit_MapNode(self, node):
+        for key_node, value_node in node.entry_nodes:
+            self.visit(key_node)
+            self.visit(value_node)
+        self.emit(OP_BUILD_MAP, len(node.entry_nodes), node)
+
+    def visit_SliceNode(self, node):
+        # arg flags which of the bounds were pushed after the value
+        self.visit(node.node)
+        for bound_node in (node.start_node, node.end_node):
+            if bound_node is not None:
+                self.visit(bound_node)
+        self.emit(
+            OP_SLICE, (node.start_node is not None, node.end_node is not None), node
+        )
+
+    def visit_UnaryOperationNode(self, node):
+        self.visit(node.node)
+        if node.op_tok.type == TT_MINUS:
+            self.emit(OP_UNARY_MINUS, None, node)
+        elif node.op_tok.matches(TT_KEYWORD, "NOT"):
+            self.emit(OP_UNARY_NOT, None, node)
+
+    def visit_BinaryOperationNode(self, node):
+        self.visit(node.left_node)
+        self.visit(node.right_node)
+        self.emit(OP_BINARY_OP, BINARY_OPERATIONS[operation_key(node.op_tok)], node)
+
+    def visit_VarAccessNode(self, node):
+        var_name = node.var_name_tok.value
+        if node.slot is not None:
+            self.emit(OP_LOAD_FAST, (node.slot, var_name), node)
+        else:
+            self.emit(OP_LOAD_NAME, var_name, node)
+
+    def visit_VarAssignNode(self, node):
+        self.visit(node.value_node)
+        if node.slot is not None:
+            self.emit(OP_STORE_FAST, node.slot, node)
+        else:
+            self.emit(OP_STORE_NAME, node.var_name_tok.value, node)
+
+    def visit_IfNode(self, node):
+        end_jumps = []
+
+        for condition, expr, should_return_null in node.cases:
+            self.visit(condition)
+            next_case_jump = self.emit(OP_JUMP_IF_FALSE, None, condition)
+            self.visit_body(expr, should_return_null)
+            end_jumps.append(self.emit(OP_JUMP, None, node))
+            self.depth -= 1
+            self.patch_jump(next_case_jump)
+
+        if node.else_case:
+            expr, should_return_null = node.else_case
+            self.visit_body(expr, should_return_null)
+        else:
+            self.emit(OP_LOAD_NULL, None, node)
+
+        for jump in end_jumps:
+            self.patch_jump(jump)
+
+    def visit_ForNode(self, node):
+        if not node.should_return_null and not node.is_lazy:
+            self.emit(OP_BUILD_LIST, 0, node)
+
+        self.visit(node.start_val_node)
+        self.visit(node.end_val_node)
+        if node.step_val_node:
+            self.visit(node.step_val_node)
+        else:
+            self.emit(OP_LOAD_NUMBER, types.Number.true, node)
+        if node.is_lazy:
+            # The VM computes each element with the body's own code when it
+            # is read
+            var_name = node.var_name_tok.value
+            element_code = ElementCompiler(self.name).compile_element(node.body_node)
+            elements_code = ElementCompiler(self.name).compile_elements(
+                node.body_node, var_name
+            )
+            self.emit(
+                OP_LAZY_LIST,
+                (node.slot, var_name, element_code, elements_code),
+                node,
+            )
+            return
+        self.emit(OP_FOR_PREP, None, node)
+
+        loop_start = self.emit(OP_FOR_ITER, None, node)
+        loop = Loop(loop_start, self.depth)
+        self.loops.append(loop)
+        if node.should_return_null:
+            self.visit_discarded(node.body_node)
+        else:
+            self.visit(node.body_node)
+            self.emit(OP_LIST_APPEND, 2, node)
+        self.emit(OP_JUMP, loop_start, node)
+        self.loops.pop()
+
+        self.patch(
+            loop_start,
+            (node.slot, node.var_name_tok.value, len(self.instructions)),
+        )
+        for jump in loop.break_jumps:
+            self.patch_jump(jump)
+        self.emit(OP_POP, None, node)
+
+        if node.should_return_null:
+            self.emit(OP_LOAD_NULL, None, node)
+
+    def visit_ForEachNode(self, node):
+        if not node.should_return_null:
+            self.emit(OP_BUILD_LIST, 0, node)
+
+        self.visit(node.iterable_node)
+        self.emit(OP_GET_ITER, None, node.iterable_node)
+
+        loop_start = self.emit(OP_FOR_EACH_ITER, None, node)
+        loop = Loop(loop_start, self.depth)
+        self.loops.append(loop)
+        if node.should_return_null:
+            self.visit_discarded(node.body_node)
+        else:
+            self.visit(node.body_node)
+            self.emit(OP_LIST_APPEND, 2, node)
+        self.emit(OP_JUMP, loop_start, node)
+        self.loops.pop()
+
+        self.patch(
+            loop_start,
+            (node.slot, node.var_name_tok.value, len(self.instructions)),
+        )
+        for jump in loop.break_jumps:
+            self.patch_jump(jump)
+        self.emit(OP_POP, None, node)
+
+        if node.should_return_null:
+            self.emit(OP_LOAD_NULL, None, node)
+
+    def visit_WhileNode(self, node):
+        if not node.should_return_null:
+            self.emit(OP_BUILD_LIST, 0, node)
+
+        loop_start = len(self.instructions)
+        self.visit(node.condition_node)
+        exit_jump = self.emit(OP_JUMP_IF_FALSE, None, node.condition_node)
+
+        loop = Loop(loop_start, self.depth)
+        self.loops.append(loop)
+        if node.should_return_null:
+            self.visit_discarded(node.body_node)
+        else:
+            self.visit(node.body_node)
+            self.emit(OP_LIST_APPEND, 1, node)
+        self.emit(OP_JUMP, loop_start, node)
+        self.loops.pop()
+
+        self.patch_jump(exit_jump)
+        for jump in loop.break_jumps:
+            self.patch_jump(jump)
+
+        if node.should_return_null:
+            self.emit(OP_LOAD_NULL, None, node)
+
+    def visit_FunctionDefinitionNode(self, node):
+        func_name = node.var_name_tok.value if node.var_name_tok else None
+        arg_names = [arg_name.value for arg_name in node.arg_name_toks]
+        code = Compiler(func_name or "<anonymous>").compile_function(node)
+        self.emit(
+            OP_MAKE_FUNCTION,
+            (
+                func_name,
+                arg_names,
+                code,
+                node.should_auto_return,
+                node.body_node,
+                node.slot,
+                node.memo,
+            ),
+            node,
+        )
+
+    def visit_CallNode(self, node):
+        self.visit(node.node_to_call)
+        for arg_node in node.arg_nodes:
+            self.visit(arg_node)
+        op = OP_TAIL_CALL if node.is_tail_call else OP_CALL
+        self.emit(op, (len(node.arg_nodes), vm.CallCache()), node)
+
+    def visit_ReturnNode(self, node):
+        if node.node_to_return:
+            self.visit(node.node_to_return)
+        else:
+            self.emit(OP_LOAD_NULL, None, node)
+        self.emit(OP_RETURN_FUNC, None, node)
+        self.depth += 1
+
+    def visit_ContinueNode(self, node):
+        self.jump_out_of_loop(node, continue_loop=True)
+
+    def visit_BreakNode(self, node):
+        self.jump_out_of_loop(node, continue_loop=False)
+
+    def jump_out_of_loop(self, node, continue_loop):
+        if not self.loops:
+            # Outside of a loop CONTINUE and BREAK stop the current body. A
+            # function returns NULL and the program ends without a value,
+            # as in the other modes.
+            if self.is_function:
+                self.emit(OP_LOAD_NULL, None, node)
+                self.emit(OP_RETURN_VALUE, None, node)
+            else:
+                self.emit(OP_RETURN_NONE, None, node)
+            self.depth += 1
+            return
+
+        loop = self.loops[-1]
+        depth = self.depth
+        for _ in range(self.depth - loop.base_depth):
+            self.emit(OP_POP, None, node)
+
+        if continue_loop:
+            self.emit(OP_JUMP, loop.continue_target, node)
+        else:
+            loop.break_jumps.append(self.emit(OP_JUMP, None, node))
+        self.depth = depth + 1
+
+
+class ElementCompiler(Compiler):
+    """
+    Compiles the body of a lazy FOR loop. It reads nothing but the counter,
+    which LazyList binds in the symbol table of its element context.
+    """
+
+    def compile_element(self, node):
+        self.visit(node)
+        self.emit(OP_RETURN_VALUE, None, node)
+        return Code(self.name, self.instructions)
+
+    def compile_elements(self, node, var_name):
+        # Loops over the counter values bound to COUNTER_NAME, for reading
+        # every element in one run
+        self.emit(OP_BUILD_LIST, 0, node)
+        self.emit(OP_LOAD_NAME, COUNTER_NAME, node)
+        loop_start = self.emit(OP_FOR_ITER, None, node)
+        self.visit(node)
+        self.emit(OP_LIST_APPEND, 2, node)
+        self.emit(OP_JUMP, loop_start, node)
+        self.patch(loop_start, (None, var_name, len(self.instructions)))
+        self.emit(OP_POP, None, node)
+        self.emit(OP_RETURN_VALUE, None, node)
+        return Code(self.name, self.instructions)
+
+    def visit_VarAccessNode(self, node):
+        self.emit(OP_LOAD_NAME, node.var_name_tok.value, node)
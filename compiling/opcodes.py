@@ -0,0 +1,33 @@
+OP_LOAD_NUMBER = 0
+OP_LOAD_STRING = 1
+OP_LOAD_NULL = 2
+OP_LOAD_NAME = 3
+OP_STORE_NAME = 4
+OP_BINARY_OP = 5
+OP_UNARY_MINUS = 6
+OP_UNARY_NOT = 7
+OP_BUILD_LIST = 8
+OP_LIST_APPEND = 9
+OP_POP = 10
+OP_JUMP = 11
+OP_JUMP_IF_FALSE = 12
+OP_FOR_PREP = 13
+OP_FOR_ITER = 14
+OP_MAKE_FUNCTION = 15
+OP_CALL = 16
+OP_RETURN_VALUE = 17
+OP_RETURN_FUNC = 18
+OP_LOAD_FAST = 19
+OP_STORE_FAST = 20
+OP_TAIL_CALL = 21
+OP_BINARY_NUMBER = 22
+OP_LAZY_LIST = 23
+OP_GET_ITER = 24
+OP_FOR_EACH_ITER = 25
+OP_BUILD_MAP = 26
+OP_SLICE = 27
+OP_RETURN_NONE = 28
+
+OPCODE_NAMES = {
+    value: name[3:] for name, value in list(globals().items()) if name.startswith("OP_")
+}
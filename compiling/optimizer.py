@@ -0,0 +1,527 @@
+from lexing.symbols import *
+from lexing.token import Token
+from parsing.nodes import *
+from runtime.interpreter import BINARY_OPERATIONS, operation_key
+import compiling.purity as purity
+import runtime.types as types
+
+ARITHMETIC_OPERATIONS = (TT_PLUS, TT_MINUS, TT_MUL, TT_DIV, TT_POW)
+# Operations that always succeed on two numbers
+TOTAL_NUMBER_OPERATIONS = (
+    TT_PLUS,
+    TT_MINUS,
+    TT_MUL,
+    TT_EE,
+    TT_LT,
+    TT_GT,
+    TT_LTE,
+    TT_GTE,
+    "AND",
+    "OR",
+)
+JUMP_NODES = (ReturnNode, ContinueNode, BreakNode)
+MAX_FOLDED_EXPONENT = 64
+MAX_FOLDED_STRING_LENGTH = 1024
+
+
+def literal_value(node):
+    if isinstance(node, NumberNode):
+        return types.Number(node.tok.value)
+    if isinstance(node, StringNode):
+        return types.String(node.tok.value)
+    return None
+
+
+def literal_node(value, node):
+    if isinstance(value, types.String):
+        return StringNode(Token(TT_STR, value.value, node.pos_start, node.pos_end))
+    tok_type = TT_FLOAT if isinstance(value.value, float) else TT_INT
+    return NumberNode(Token(tok_type, value.value, node.pos_start, node.pos_end))
+
+
+def is_pure(node):
+    # Evaluating the node can neither fail nor change any binding
+    if isinstance(node, (NumberNode, StringNode)):
+        return True
+    if isinstance(node, ListNode):
+        return all(is_pure(n) for n in node.element_nodes)
+    return isinstance(node, FunctionDefinitionNode) and not node.var_name_tok
+
+
+def is_number_expression(node, var_name):
+    # Evaluating the node can't fail and reads nothing but var_name, which
+    # holds a number
+    if isinstance(node, NumberNode):
+        return True
+    if isinstance(node, VarAccessNode):
+        return node.var_name_tok.value == var_name
+    if isinstance(node, UnaryOperationNode):
+        return is_number_expression(node.node, var_name)
+    if isinstance(node, BinaryOperationNode):
+        op = operation_key(node.op_tok)
+        if op == TT_DIV:
+            right = node.right_node
+            if not isinstance(right, NumberNode) or right.tok.value == 0:
+                return False
+        elif op not in TOTAL_NUMBER_OPERATIONS:
+            return False
+        return is_number_expression(
+            node.left_node, var_name
+        ) and is_number_expression(node.right_node, var_name)
+    if isinstance(node, IfNode):
+        nodes = [n for condition, expr, _ in node.cases for n in (condition, expr)]
+        if node.else_case:
+            nodes.append(node.else_case[0])
+        return all(is_number_expression(n, var_name) for n in nodes)
+    return False
+
+
+def is_literal_int(node, value):
+    return (
+        isinstance(node, NumberNode)
+        and type(node.tok.value) is int
+        and node.tok.value == value
+    )
+
+
+class NodeTransformer:
+    """Visits every node and replaces each child with what its visit returns"""
+
+    def visit(self, node):
+        method_name = f"visit_{type(node).__name__}"
+        method = getattr(self, method_name, self.no_visit_method)
+        return method(node)
+
+    def no_visit_method(self, node):
+        raise Exception(f"No visit_{type(node).__name__} method defined")
+
+    def visit_NumberNode(self, node):
+        return node
+
+    def visit_StringNode(self, node):
+        return node
+
+    def visit_ListNode(self, node):
+        node.element_nodes = [self.visit(n) for n in node.element_nodes]
+        return node
+
+    def visit_MapNode(self, node):
+        node.entry_nodes = [
+            (self.visit(key_node), self.visit(value_node))
+            for key_node, value_node in node.entry_nodes
+        ]
+        return node
+
+    def visit_SliceNode(self, node):
+        node.node = self.visit(node.node)
+        if node.start_node is not None:
+            node.start_node = self.visit(node.start_node)
+        if node.end_node is not None:
+            node.end_node = self.visit(node.end_node)
+        return node
+
+    def visit_UnaryOperationNode(self, node):
+        node.node = self.visit(node.node)
+        return node
+
+    def visit_BinaryOperationNode(self, node):
+        node.left_node = self.visit(node.left_node)
+        node.right_node = self.visit(node.right_node)
+        return node
+
+    def visit_VarAccessNode(self, node):
+        return node
+
+    def visit_VarAssignNode(self, node):
+        node.value_node = self.visit(node.value_node)
+        return node
+
+    def visit_IfNode(self, node):
+        node.cases = [
+            (self.visit(condition), self.visit(expr), should_return_null)
+            for condition, expr, should_return_null in node.cases
+        ]
+        if node.else_case:
+            node.else_case = (self.visit(node.else_case[0]), node.else_case[1])
+        return node
+
+    def visit_ForNode(self, node):
+        node.start_val_node = self.visit(node.start_val_node)
+        node.end_val_node = self.visit(node.end_val_node)
+        if node.step_val_node:
+            node.step_val_node = self.visit(node.step_val_node)
+        node.body_node = self.visit(node.body_node)
+        return node
+
+    def visit_ForEachNode(self, node):
+        node.iterable_node = self.visit(node.iterable_node)
+        node.body_node = self.visit(node.body_node)
+        return node
+
+    def visit_WhileNode(self, node):
+        node.condition_node = self.visit(node.condition_node)
+        node.body_node = self.visit(node.body_node)
+        return node
+
+    def visit_FunctionDefinitionNode(self, node):
+        node.body_node = self.visit(node.body_node)
+        return node
+
+    def visit_CallNode(self, node):
+        node.node_to_call = self.visit(node.node_to_call)
+        node.arg_nodes = [self.visit(n) for n in node.arg_nodes]
+        return node
+
+    def visit_ReturnNode(self, node):
+        if node.node_to_return:
+            node.node_to_return = self.visit(node.node_to_return)
+        return node
+
+    def visit_ContinueNode(self, node):
+        return node
+
+    def visit_BreakNode(self, node):
+        return node
+
+
+class ConstantFolder(NodeTransformer):
+    """
+    Folds operations on literals and simplifies numeric identities.
+    Operations that would fail at runtime are left in place so the error
+    still happens at the original position.
+
+    Names in constants are replaced by their literal value wherever they
+    are read outside of a function body.
+    """
+
+    def __init__(self):
+        self.constants = {}
+
+    def is_numeric(self, node):
+        # True when the node evaluates to a Number or fails with an error
+        if isinstance(node, NumberNode):
+            return True
+        if isinstance(node, UnaryOperationNode):
+            if node.op_tok.matches(TT_KEYWORD, "NOT"):
+                return True
+            return self.is_numeric(node.node)
+        if isinstance(node, BinaryOperationNode):
+            if node.op_tok.type not in ARITHMETIC_OPERATIONS:
+                return True
+            return self.is_numeric(node.left_node) and self.is_numeric(
+                node.right_node
+            )
+        return False
+
+    def fold(self, node, operation):
+        try:
+            result, error = operation()
+        except (ArithmeticError, ValueError):
+            return node
+        if error or not isinstance(result, (types.Number, types.String)):
+            return node
+        if isinstance(result, types.Number) and type(result.value) not in (int, float):
+            return node
+        return literal_node(result, node)
+
+    def visit_UnaryOperationNode(self, node):
+        node.node = self.visit(node.node)
+        if node.op_tok.type == TT_PLUS:
+            return node.node
+
+        if isinstance(node.node, NumberNode):
+            value = literal_value(node.node)
+            if node.op_tok.type == TT_MINUS:
+                return self.fold(node, lambda: value.multiplied_by(-1))
+            return self.fold(node, value.notted)
+        return node
+
+    def visit_BinaryOperationNode(self, node):
+        node.left_node = self.visit(node.left_node)
+        node.right_node = self.visit(node.right_node)
+        left, right = node.left_node, node.right_node
+        op_type = node.op_tok.type
+
+        left_value, right_value = literal_value(left), literal_value(right)
+        if left_value and right_value:
+            if (
+                op_type == TT_POW
+                and isinstance(right_value, types.Number)
+                and abs(right_value.value) > MAX_FOLDED_EXPONENT
+            ):
+                return node
+            if op_type == TT_MUL and self.folded_length(left_value, right_value) > (
+                MAX_FOLDED_STRING_LENGTH
+            ):
+                return node
+            method_name = BINARY_OPERATIONS[operation_key(node.op_tok)]
+            return self.fold(
+                node, lambda: getattr(left_value, method_name)(right_value)
+            )
+
+        # Identities only hold for numbers: x + 0 appends to a list and
+        # x * 1 is an error for one, so the other side must be numeric
+        if op_type in (TT_PLUS, TT_MINUS) and is_literal_int(right, 0):
+            return left if self.is_numeric(left) else node
+        if op_type == TT_PLUS and is_literal_int(left, 0):
+            return right if self.is_numeric(right) else node
+        if op_type in (TT_MUL, TT_POW) and is_literal_int(right, 1):
+            return left if self.is_numeric(left) else node
+        if op_type == TT_MUL and is_literal_int(left, 1):
+            return right if self.is_numeric(right) else node
+        return node
+
+    def folded_length(self, left_value, right_value):
+        for string, count in ((left_value, right_value), (right_value, left_value)):
+            if isinstance(string, types.String) and isinstance(count, types.Number):
+                return len(string.value) * max(count.value, 0)
+        return 0
+
+    def visit_VarAccessNode(self, node):
+        value_node = self.constants.get(node.var_name_tok.value)
+        if value_node is None:
+            return node
+        return literal_node(literal_value(value_node), node)
+
+    def visit_IfNode(self, node):
+        cases = []
+        else_case = (
+            (self.visit(node.else_case[0]), node.else_case[1])
+            if node.else_case
+            else None
+        )
+
+        for condition, expr, should_return_null in node.cases:
+            condition = self.visit(condition)
+            expr = self.visit(expr)
+            condition_value = literal_value(condition)
+
+            if condition_value is None:
+                cases.append((condition, expr, should_return_null))
+            elif condition_value.is_true():
+                else_case = (expr, should_return_null)
+                break
+
+        if not cases:
+            if not else_case:
+                return literal_node(types.Number.null, node)
+            expr, should_return_null = else_case
+            if not should_return_null:
+                return expr
+            # The branch still has to evaluate to NULL, so keep a single
+            # case guarded by a literal
+            cases = [(literal_node(types.Number.true, node), expr, True)]
+            else_case = None
+
+        node.cases = cases
+        node.else_case = else_case
+        return node
+
+    def visit_WhileNode(self, node):
+        node = super().visit_WhileNode(node)
+        condition_value = literal_value(node.condition_node)
+        if condition_value is None or condition_value.is_true():
+            return node
+        if node.should_return_null:
+            return literal_node(types.Number.null, node)
+        return ListNode([], node.pos_start, node.pos_end)
+
+    def visit_FunctionDefinitionNode(self, node):
+        # Scoping is dynamic, so a caller from another program could bind
+        # the same name in a frame the function body reads from
+        constants, self.constants = self.constants, {}
+        node = super().visit_FunctionDefinitionNode(node)
+        self.constants = constants
+        return node
+
+
+class BindingCounter(NodeTransformer):
+    """Counts the VAR assignments to each name and notes every other kind of binding"""
+
+    def __init__(self):
+        self.assignments = {}
+        self.definitions = {}
+        self.bound_names = set()
+        self.parameter_names = set()
+        self.accessed_names = set()
+
+    def visit_VarAccessNode(self, node):
+        self.accessed_names.add(node.var_name_tok.value)
+        return node
+
+    def visit_VarAssignNode(self, node):
+        var_name = node.var_name_tok.value
+        self.assignments[var_name] = self.assignments.get(var_name, 0) + 1
+        return super().visit_VarAssignNode(node)
+
+    def visit_ForNode(self, node):
+        self.bound_names.add(node.var_name_tok.value)
+        self.parameter_names.add(node.var_name_tok.value)
+        return super().visit_ForNode(node)
+
+    def visit_ForEachNode(self, node):
+        self.bound_names.add(node.var_name_tok.value)
+        self.parameter_names.add(node.var_name_tok.value)
+        return super().visit_ForEachNode(node)
+
+    def visit_FunctionDefinitionNode(self, node):
+        if node.var_name_tok:
+            func_name = node.var_name_tok.value
+            self.bound_names.add(func_name)
+            self.definitions[func_name] = self.definitions.get(func_name, 0) + 1
+        arg_names = [tok.value for tok in node.arg_name_toks]
+        self.bound_names.update(arg_names)
+        self.parameter_names.update(arg_names)
+        return super().visit_FunctionDefinitionNode(node)
+
+
+def constant_flags(node):
+    """
+    Names assigned once by a top level statement and never bound anywhere
+    else in the program, so every later read sees the assigned value.
+    """
+    counter = BindingCounter()
+    counter.visit(node)
+    if "RUN" in counter.accessed_names:
+        # Another program run into the global table could reassign them
+        return set()
+
+    return {
+        statement.var_name_tok.value
+        for statement in node.element_nodes
+        if isinstance(statement, VarAssignNode)
+        and counter.assignments[statement.var_name_tok.value] == 1
+        and statement.var_name_tok.value not in counter.bound_names
+    }
+
+
+class DeadCodeEliminator(NodeTransformer):
+    """
+    Removes statements after a RETURN, CONTINUE or BREAK, and statements
+    without side effects in bodies whose value is thrown away.
+    """
+
+    def visit_body(self, node, is_discarded):
+        node = self.visit(node)
+        if is_discarded and isinstance(node, ListNode):
+            node.element_nodes = [n for n in node.element_nodes if not is_pure(n)]
+        return node
+
+    def visit_ListNode(self, node):
+        element_nodes = []
+        for element_node in node.element_nodes:
+            element_node = self.visit(element_node)
+            element_nodes.append(element_node)
+            if isinstance(element_node, JUMP_NODES):
+                break
+        node.element_nodes = element_nodes
+        return node
+
+    def visit_IfNode(self, node):
+        node.cases = [
+            (
+                self.visit(condition),
+                self.visit_body(expr, should_return_null),
+                should_return_null,
+            )
+            for condition, expr, should_return_null in node.cases
+        ]
+        if node.else_case:
+            expr, should_return_null = node.else_case
+            node.else_case = (
+                self.visit_body(expr, should_return_null),
+                should_return_null,
+            )
+        return node
+
+    def visit_ForNode(self, node):
+        node.start_val_node = self.visit(node.start_val_node)
+        node.end_val_node = self.visit(node.end_val_node)
+        if node.step_val_node:
+            node.step_val_node = self.visit(node.step_val_node)
+        node.body_node = self.visit_body(node.body_node, node.should_return_null)
+        return node
+
+    def visit_ForEachNode(self, node):
+        node.iterable_node = self.visit(node.iterable_node)
+        node.body_node = self.visit_body(node.body_node, node.should_return_null)
+        return node
+
+    def visit_WhileNode(self, node):
+        node.condition_node = self.visit(node.condition_node)
+        node.body_node = self.visit_body(node.body_node, node.should_return_null)
+        return node
+
+    def visit_FunctionDefinitionNode(self, node):
+        node.body_node = self.visit_body(
+            node.body_node, not node.should_auto_return
+        )
+        return node
+
+
+class TailCallMarker(NodeTransformer):
+    """Marks the calls whose result a function returns without using it"""
+
+    def __init__(self):
+        self.in_function = False
+
+    def mark(self, node):
+        if isinstance(node, CallNode):
+            node.is_tail_call = True
+        elif isinstance(node, IfNode):
+            for _, expr, should_return_null in node.cases:
+                if not should_return_null:
+                    self.mark(expr)
+            if node.else_case and not node.else_case[1]:
+                self.mark(node.else_case[0])
+
+    def visit_FunctionDefinitionNode(self, node):
+        in_function, self.in_function = self.in_function, True
+        node = super().visit_FunctionDefinitionNode(node)
+        if node.should_auto_return:
+            self.mark(node.body_node)
+        self.in_function = in_function
+        return node
+
+    def visit_ReturnNode(self, node):
+        node = super().visit_ReturnNode(node)
+        if self.in_function and node.node_to_return:
+            self.mark(node.node_to_return)
+        return node
+
+
+class LazyLoopMarker(NodeTransformer):
+    """
+    Marks the FOR loops whose list can be computed element by element when
+    it is read: each element only depends on the counter and can't fail
+    """
+
+    def visit_ForNode(self, node):
+        node = super().visit_ForNode(node)
+        if not node.should_return_null and is_number_expression(
+            node.body_node, node.var_name_tok.value
+        ):
+            node.is_lazy = True
+        return node
+
+
+def optimize(node):
+    folder = ConstantFolder()
+    if isinstance(node, ListNode):
+        flags = constant_flags(node)
+        for index, statement in enumerate(node.element_nodes):
+            statement = node.element_nodes[index] = folder.visit(statement)
+            if (
+                isinstance(statement, VarAssignNode)
+                and statement.var_name_tok.value in flags
+                and literal_value(statement.value_node) is not None
+            ):
+                folder.constants[statement.var_name_tok.value] = statement.value_node
+    else:
+        node = folder.visit(node)
+
+    node = DeadCodeEliminator().visit(node)
+    node = TailCallMarker().visit(node)
+    node = LazyLoopMarker().visit(node)
+    purity.memoize_pure_functions(node)
+    return node
@@ -0,0 +1,264 @@
+from parsing.nodes import *
+from runtime.memo import MemoCache, depend_on
+import compiling.optimizer as optimizer
+
+# Globals a pure function may read. The callable ones return a value
+# computed only from their arguments.
+PURE_CONSTANTS = {"NULL", "FALSE", "TRUE"}
+PURE_BUILTINS = {
+    "PRINT_RET",
+    "IS_NUM",
+    "IS_STR",
+    "IS_LIST",
+    "IS_FUN",
+    "LEN",
+    "VECTOR",
+    "VRANGE",
+    "RANGE",
+    "SUM",
+    "MIN",
+    "MAX",
+    "SORT",
+    "HAS",
+    "STR",
+    "SLICE",
+    "SUBSTR",
+}
+
+
+class PurityChecker:
+    """
+    Checks that a function body only reads its own arguments and locals,
+    the pure builtins and other pure functions. Scoping is dynamic, so a
+    local read before it is assigned would see the caller's binding and
+    makes the function impure. Assignments only ever bind locals.
+    """
+
+    def __init__(self, pure_functions, pure_names):
+        self.pure_functions = pure_functions
+        self.pure_names = pure_names
+        self.assigned = set()
+
+    def check(self, node):
+        self.assigned = {tok.value for tok in node.arg_name_toks}
+        return self.visit(node.body_node)
+
+    def visit(self, node):
+        method_name = f"visit_{type(node).__name__}"
+        method = getattr(self, method_name, self.no_visit_method)
+        return method(node)
+
+    def no_visit_method(self, node):
+        raise Exception(f"No visit_{type(node).__name__} method defined")
+
+    def visit_all(self, nodes):
+        return all(self.visit(node) for node in nodes)
+
+    def visit_branch(self, node):
+        # Returns the names certainly assigned once the branch has run
+        assigned = self.assigned
+        self.assigned = set(assigned)
+        is_pure = self.visit(node)
+        branch_assigned, self.assigned = self.assigned, assigned
+        return is_pure, branch_assigned
+
+    def visit_NumberNode(self, node):
+        return True
+
+    def visit_StringNode(self, node):
+        return True
+
+    def visit_ListNode(self, node):
+        return self.visit_all(node.element_nodes)
+
+    def visit_MapNode(self, node):
+        return self.visit_all([n for entry in node.entry_nodes for n in entry])
+
+    def visit_SliceNode(self, node):
+        return self.visit_all(
+            [n for n in (node.node, node.start_node, node.end_node) if n is not None]
+        )
+
+    def visit_UnaryOperationNode(self, node):
+        return self.visit(node.node)
+
+    def visit_BinaryOperationNode(self, node):
+        return self.visit_all([node.left_node, node.right_node])
+
+    def visit_VarAccessNode(self, node):
+        var_name = node.var_name_tok.value
+        return (
+            var_name in self.assigned
+            or var_name in self.pure_names
+            or var_name in self.pure_functions
+        )
+
+    def visit_VarAssignNode(self, node):
+        if not self.visit(node.value_node):
+            return False
+        self.assigned.add(node.var_name_tok.value)
+        return True
+
+    def visit_IfNode(self, node):
+        branches = []
+        for condition, expr, _ in node.cases:
+            if not self.visit(condition):
+                return False
+            is_pure, assigned = self.visit_branch(expr)
+            if not is_pure:
+                return False
+            branches.append(assigned)
+
+        if node.else_case:
+            is_pure, assigned = self.visit_branch(node.else_case[0])
+            if not is_pure:
+                return False
+            branches.append(assigned)
+        else:
+            branches.append(self.assigned)
+
+        self.assigned = set.intersection(*branches)
+        return True
+
+    def visit_ForNode(self, node):
+        value_nodes = [node.start_val_node, node.end_val_node]
+        if node.step_val_node:
+            value_nodes.append(node.step_val_node)
+        if not self.visit_all(value_nodes):
+            return False
+
+        # The body may run no times at all, so nothing it assigns (not even
+        # the loop variable) is certain afterwards
+        assigned = self.assigned
+        self.assigned = assigned | {node.var_name_tok.value}
+        is_pure = self.visit(node.body_node)
+        self.assigned = assigned
+        return is_pure
+
+    def visit_ForEachNode(self, node):
+        if not self.visit(node.iterable_node):
+            return False
+        assigned = self.assigned
+        self.assigned = assigned | {node.var_name_tok.value}
+        is_pure = self.visit(node.body_node)
+        self.assigned = assigned
+        return is_pure
+
+    def visit_WhileNode(self, node):
+        if not self.visit(node.condition_node):
+            return False
+        is_pure, _ = self.visit_branch(node.body_node)
+        return is_pure
+
+    def visit_FunctionDefinitionNode(self, node):
+        # A nested function runs in the frame of whoever calls it
+        return False
+
+    def visit_CallNode(self, node):
+        callee = node.node_to_call
+        if not isinstance(callee, VarAccessNode):
+            return False
+        func_name = callee.var_name_tok.value
+        if func_name in self.assigned:
+            return False
+        if func_name not in self.pure_functions and func_name not in self.pure_names:
+            return False
+        return self.visit_all(node.arg_nodes)
+
+    def visit_ReturnNode(self, node):
+        return node.node_to_return is None or self.visit(node.node_to_return)
+
+    def visit_ContinueNode(self, node):
+        return True
+
+    def visit_BreakNode(self, node):
+        return True
+
+
+def pure_functions(node):
+    """
+    The named top level functions of the program that are pure, keyed by
+    name. Their names are bound by nothing but their own definition, so
+    every call by that name reaches it.
+    """
+    if not isinstance(node, ListNode):
+        return {}
+
+    counter = optimizer.BindingCounter()
+    counter.visit(node)
+    if "RUN" in counter.accessed_names:
+        # Another program run into the global table could redefine them
+        return {}
+
+    def is_fixed(name):
+        return name not in counter.assignments and name not in counter.parameter_names
+
+    candidates = {
+        statement.var_name_tok.value: statement
+        for statement in node.element_nodes
+        if isinstance(statement, FunctionDefinitionNode)
+        and statement.var_name_tok
+        and counter.definitions[statement.var_name_tok.value] == 1
+        and is_fixed(statement.var_name_tok.value)
+    }
+    pure_names = {
+        name
+        for name in PURE_CONSTANTS | PURE_BUILTINS
+        if is_fixed(name) and name not in counter.definitions
+    }
+
+    # Start from every candidate and drop the impure ones until the rest
+    # only call each other
+    is_changed = True
+    while is_changed:
+        is_changed = False
+        for func_name, definition in list(candidates.items()):
+            if not PurityChecker(candidates, pure_names).check(definition):
+                del candidates[func_name]
+                is_changed = True
+    return candidates
+
+
+def free_names(definition):
+    """The names a function body reads that are not its arguments or locals"""
+    counter = optimizer.BindingCounter()
+    counter.visit(definition.body_node)
+    local_names = counter.parameter_names | counter.assignments.keys()
+    local_names.update(tok.value for tok in definition.arg_name_toks)
+    return counter.accessed_names - local_names
+
+
+def dependencies(functions):
+    """The free names of each function and of every function it calls"""
+    names = {
+        func_name: free_names(definition)
+        for func_name, definition in functions.items()
+    }
+    is_changed = True
+    while is_changed:
+        is_changed = False
+        for func_name, dependency_names in names.items():
+            for callee in dependency_names & functions.keys():
+                if not names[callee] <= dependency_names:
+                    dependency_names |= names[callee]
+                    is_changed = True
+    return names
+
+
+def bound_names(node):
+    """Every name the program binds, as a variable, parameter or function"""
+    counter = optimizer.BindingCounter()
+    counter.visit(node)
+    return counter.bound_names | counter.assignments.keys()
+
+
+def memoize_pure_functions(node):
+    functions = pure_functions(node)
+    for func_name, dependency_names in dependencies(functions).items():
+        definition = functions[func_name]
+        # A function declared with FUN MEMO keeps the cache it asked for
+        if definition.memo is not None:
+            continue
+        definition.memo = MemoCache()
+        definition.memo_dependencies = dependency_names
+        depend_on(definition.memo, dependency_names)
@@ -0,0 +1,145 @@
+class FunctionScope:
+    def __init__(self, arg_names):
+        self.slot_names = {}
+        for arg_name in arg_names:
+            self.declare(arg_name)
+
+    def declare(self, name):
+        if name not in self.slot_names:
+            self.slot_names[name] = len(self.slot_names)
+
+
+class Resolver:
+    def __init__(self):
+        self.scope = None
+
+    def resolve(self, node):
+        self.visit(node)
+
+    def declare(self, name):
+        if self.scope:
+            self.scope.declare(name)
+
+    def slot(self, name):
+        if self.scope:
+            return self.scope.slot_names.get(name)
+        return None
+
+    def visit(self, node):
+        method_name = f"visit_{type(node).__name__}"
+        method = getattr(self, method_name, self.no_visit_method)
+        return method(node)
+
+    def no_visit_method(self, node):
+        raise Exception(f"No visit_{type(node).__name__} method defined")
+
+    def visit_NumberNode(self, node):
+        pass
+
+    def visit_StringNode(self, node):
+        pass
+
+    def visit_ListNode(self, node):
+        for element_node in node.element_nodes:
+            self.visit(element_node)
+
+    def visit_MapNode(self, node):
+        for key_node, value_node in node.entry_nodes:
+            self.visit(key_node)
+            self.visit(value_node)
+
+    def visit_SliceNode(self, node):
+        for child in (node.node, node.start_node, node.end_node):
+            if child is not None:
+                self.visit(child)
+
+    def visit_UnaryOperationNode(self, node):
+        self.visit(node.node)
+
+    def visit_BinaryOperationNode(self, node):
+        self.visit(node.left_node)
+        self.visit(node.right_node)
+
+    def visit_VarAccessNode(self, node):
+        node.slot = self.slot(node.var_name_tok.value)
+
+    def visit_VarAssignNode(self, node):
+        self.visit(node.value_node)
+        node.slot = self.slot(node.var_name_tok.value)
+
+    def visit_IfNode(self, node):
+        for condition, expr, _ in node.cases:
+            self.visit(condition)
+            self.visit(expr)
+        if node.else_case:
+            self.visit(node.else_case[0])
+
+    def visit_ForNode(self, node):
+        self.visit(node.start_val_node)
+        self.visit(node.end_val_node)
+        if node.step_val_node:
+            self.visit(node.step_val_node)
+        node.slot = self.slot(node.var_name_tok.value)
+        self.visit(node.body_node)
+
+    def visit_ForEachNode(self, node):
+        self.visit(node.iterable_node)
+        node.slot = self.slot(node.var_name_tok.value)
+        self.visit(node.body_node)
+
+    def visit_WhileNode(self, node):
+        self.visit(node.condition_node)
+        self.visit(node.body_node)
+
+    def visit_FunctionDefinitionNode(self, node):
+        if node.var_name_tok:
+            node.slot = self.slot(node.var_name_tok.value)
+
+        outer_scope = self.scope
+        self.scope = FunctionScope([tok.value for tok in node.arg_name_toks])
+        DeclarationCollector(self.scope).visit(node.body_node)
+        self.visit(node.body_node)
+        node.slot_names = self.scope.slot_names
+        self.scope = outer_scope
+
+    def visit_CallNode(self, node):
+        self.visit(node.node_to_call)
+        for arg_node in node.arg_nodes:
+            self.visit(arg_node)
+
+    def visit_ReturnNode(self, node):
+        if node.node_to_return:
+            self.visit(node.node_to_return)
+
+    def visit_ContinueNode(self, node):
+        pass
+
+    def visit_BreakNode(self, node):
+        pass
+
+
+class DeclarationCollector(Resolver):
+    """Declares every name a function body binds, without entering nested functions"""
+
+    def __init__(self, scope):
+        super().__init__()
+        self.scope = scope
+
+    def visit_VarAccessNode(self, node):
+        pass
+
+    def visit_VarAssignNode(self, node):
+        self.declare(node.var_name_tok.value)
+        self.visit(node.value_node)
+
+    def visit_ForNode(self, node):
+        self.declare(node.var_name_tok.value)
+        super().visit_ForNode(node)
+
+    def visit_ForEachNode(self, node):
+        self.declare(node.var_name_tok.value)
+        super().visit_ForEachNode(node)
+
+    def visit_FunctionDefinitionNode(self, node):
+        if node.var_name_tok:
+            self.declare(node.var_name_tok.value)
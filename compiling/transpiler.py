@@ -0,0 +1,469 @@
+from contextlib import contextmanager
+import hashlib
+import os
+
+from lexing.symbols import *
+from parsing.nodes import *
+from runtime.interpreter import BINARY_OPERATIONS, operation_key
+from compiling.purity import bound_names
+
+TRANSPILER_VERSION = 11
+CACHE_SUFFIX = ".py"
+# The first two lines of every generated module. A file next to the source
+# that doesn't start with them is the user's own and is never overwritten.
+GENERATED_HEADER = "# Generated from "
+HASH_HEADER = "# source-sha256: "
+
+
+class Scope:
+    def __init__(self, is_function):
+        self.is_function = is_function
+        self.lines = []
+        self.indent = 1
+        self.temp_count = 0
+        self.loop_depth = 0
+
+
+class Transpiler:
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.line_table = []
+        self.line_table_indices = {}
+        self.constants = []
+        self.constant_names = {}
+        self.functions = []
+        self.scope = None
+
+    def transpile(self, node, source_hash):
+        program = self.transpile_body("__program__", node, False, False)
+        line_table = "".join(f"    {entry},\n" for entry in self.line_table)
+        constants = "".join(f"{constant}\n" for constant in self.constants)
+        return (
+            f"{GENERATED_HEADER}{self.file_name}, do not edit\n"
+            f"{HASH_HEADER}{source_hash}\n"
+            "from runtime.transpiled import *\n\n"
+            f"forget_names({sorted(bound_names(node))!r})\n\n"
+            f"LINE_TABLE = [\n{line_table}]\n\n"
+            f"{constants}\n\n"
+            + "".join(f"{function}\n\n" for function in self.functions)
+            + program
+        )
+
+    def transpile_body(self, name, node, is_function, discard):
+        outer_scope = self.scope
+        self.scope = Scope(is_function)
+        self.emit("st = context.symbol_table")
+        if discard:
+            self.discard(node)
+            self.emit("return NULL")
+        else:
+            self.emit(f"return {self.visit(node)}")
+        lines = self.scope.lines
+        self.scope = outer_scope
+        return f"def {name}(context):\n" + "\n".join(lines) + "\n"
+
+    def emit(self, line):
+        self.scope.lines.append("    " * self.scope.indent + line)
+
+    @contextmanager
+    def block(self, is_loop=False):
+        line_count = len(self.scope.lines)
+        self.scope.indent += 1
+        self.scope.loop_depth += is_loop
+        yield
+        if len(self.scope.lines) == line_count:
+            self.emit("pass")
+        self.scope.loop_depth -= is_loop
+        self.scope.indent -= 1
+
+    def temp(self):
+        self.scope.temp_count += 1
+        return f"_t{self.scope.temp_count}"
+
+    def position(self, node):
+        entry = (
+            node.pos_start.idx,
+            node.pos_start.ln,
+            node.pos_start.col,
+            node.pos_end.idx,
+            node.pos_end.ln,
+            node.pos_end.col,
+        )
+        if entry not in self.line_table_indices:
+            self.line_table_indices[entry] = len(self.line_table)
+            self.line_table.append(entry)
+        return f"P[{self.line_table_indices[entry]}]"
+
+    def constant(self, loader, value):
+        # Literals are created once when the module loads and shared by
+        # every evaluation
+        key = (loader, type(value), value)
+        if key not in self.constant_names:
+            name = f"_c{len(self.constants)}"
+            self.constant_names[key] = name
+            self.constants.append(f"{name} = {loader}({value!r})")
+        return self.constant_names[key]
+
+    def has_statements(self, node):
+        if isinstance(node, (IfNode, ForNode, ForEachNode, WhileNode)):
+            return True
+        if isinstance(node, (ReturnNode, ContinueNode, BreakNode)):
+            return True
+        if isinstance(node, ListNode):
+            return any(self.has_statements(n) for n in node.element_nodes)
+        if isinstance(node, MapNode):
+            return any(
+                self.has_statements(n) for entry in node.entry_nodes for n in entry
+            )
+        if isinstance(node, BinaryOperationNode):
+            return self.has_statements(node.left_node) or self.has_statements(
+                node.right_node
+            )
+        if isinstance(node, UnaryOperationNode):
+            return self.has_statements(node.node)
+        if isinstance(node, SliceNode):
+            return any(
+                n is not None and self.has_statements(n)
+                for n in (node.node, node.start_node, node.end_node)
+            )
+        if isinstance(node, VarAssignNode):
+            return self.has_statements(node.value_node)
+        if isinstance(node, CallNode):
+            return any(
+                self.has_statements(n) for n in [node.node_to_call] + node.arg_nodes
+            )
+        return False
+
+    def is_simple(self, value):
+        return value == "NULL" or value.startswith(("_t", "_c"))
+
+    def spill(self, value):
+        if self.is_simple(value):
+            return value
+        temp = self.temp()
+        self.emit(f"{temp} = {value}")
+        return temp
+
+    def operands(self, nodes):
+        # Operands are evaluated left to right, so anything already computed
+        # has to be stored before a later operand emits statements of its own
+        values = []
+        for node in nodes:
+            if values and self.has_statements(node):
+                values = [self.spill(value) for value in values]
+            values.append(self.visit(node))
+        return values
+
+    def discard(self, node):
+        nodes = node.element_nodes if isinstance(node, ListNode) else [node]
+        for element_node in nodes:
+            value = self.visit(element_node)
+            if not self.is_simple(value):
+                self.emit(value)
+
+    def assign_body(self, node, should_return_null, target):
+        if should_return_null:
+            self.discard(node)
+            self.emit(f"{target} = NULL")
+        else:
+            self.emit(f"{target} = {self.visit(node)}")
+
+    def visit(self, node):
+        method_name = f"visit_{type(node).__name__}"
+        method = getattr(self, method_name, self.no_visit_method)
+        return method(node)
+
+    def no_visit_method(self, node):
+        raise Exception(f"No visit_{type(node).__name__} method defined")
+
+    def visit_NumberNode(self, node):
+        return self.constant("number_constant", node.tok.value)
+
+    def visit_StringNode(self, node):
+        return self.constant("string_constant", node.tok.value)
+
+    def visit_ListNode(self, node):
+        elements = ", ".join(self.operands(node.element_nodes))
+        return f"build_list([{elements}], context, {self.position(node)})"
+
+    def visit_MapNode(self, node):
+        values = self.operands([n for entry in node.entry_nodes for n in entry])
+        pairs = ", ".join(
+            f"({key}, {value})" for key, value in zip(values[::2], values[1::2])
+        )
+        return f"build_map([{pairs}], context, {self.position(node)})"
+
+    def visit_SliceNode(self, node):
+        nodes = [node.node, node.start_node, node.end_node]
+        values = iter(self.operands([n for n in nodes if n is not None]))
+        value, start, end = ["None" if n is None else next(values) for n in nodes]
+        return f"slice_value({value}, {start}, {end}, context, {self.position(node)})"
+
+    def visit_UnaryOperationNode(self, node):
+        value = self.visit(node.node)
+        if node.op_tok.type == TT_MINUS:
+            return f"unary_minus({value}, context, {self.position(node)})"
+        elif node.op_tok.matches(TT_KEYWORD, "NOT"):
+            return f"unary_not({value}, context, {self.position(node)})"
+        return value
+
+    def visit_BinaryOperationNode(self, node):
+        left, right = self.operands([node.left_node, node.right_node])
+        method_name = BINARY_OPERATIONS[operation_key(node.op_tok)]
+        return (
+            f"binary_operation({left}, {right}, {method_name!r}, "
+            f"context, {self.position(node)})"
+        )
+
+    def visit_VarAccessNode(self, node):
+        var_name = node.var_name_tok.value
+        return f"load_name(st, {var_name!r}, context, {self.position(node)})"
+
+    def visit_VarAssignNode(self, node):
+        var_name = node.var_name_tok.value
+        return f"store_name(st, {var_name!r}, {self.visit(node.value_node)})"
+
+    def visit_IfNode(self, node):
+        target = self.temp()
+        self.if_cases(node.cases, node.else_case, target)
+        return target
+
+    def if_cases(self, cases, else_case, target):
+        condition, expr, should_return_null = cases[0]
+        self.emit(f"if {self.visit(condition)}.is_true():")
+        with self.block():
+            self.assign_body(expr, should_return_null, target)
+
+        for index in range(1, len(cases)):
+            condition, expr, should_return_null = cases[index]
+            if self.has_statements(condition):
+                # The condition needs statements of its own, so the remaining
+                # cases continue inside a nested else block
+                self.emit("else:")
+                with self.block():
+                    self.if_cases(cases[index:], else_case, target)
+                return
+
+            self.emit(f"elif {self.visit(condition)}.is_true():")
+            with self.block():
+                self.assign_body(expr, should_return_null, target)
+
+        self.emit("else:")
+        with self.block():
+            if else_case:
+                self.assign_body(*else_case, target)
+            else:
+                self.emit(f"{target} = NULL")
+
+    def visit_ForNode(self, node):
+        value_nodes = [node.start_val_node, node.end_val_node]
+        if node.step_val_node:
+            value_nodes.append(node.step_val_node)
+        values = self.operands(value_nodes)
+
+        step = f"{values[2]}.value" if len(values) > 2 else "1"
+        var_name = node.var_name_tok.value
+        if node.is_lazy:
+            index = len(self.functions)
+            element_name = f"_element_{index}"
+            self.functions.append(None)
+            self.functions[index] = self.transpile_body(
+                element_name, node.body_node, False, False
+            )
+            elements = self.temp()
+            self.emit(
+                f"{elements} = lazy_list({values[0]}.value, {values[1]}.value, "
+                f"{step}, {var_name!r}, {element_name})"
+            )
+            self.emit(f"if {elements}.counter:")
+            with self.block():
+                self.emit(
+                    f"st.symbols[{var_name!r}] = make_number({elements}.counter[-1])"
+                )
+            return self.spill(
+                f"{elements}.set_context(context).set_pos(*{self.position(node)})"
+            )
+
+        counter = f"for_range({values[0]}.value, {values[1]}.value, {step})"
+
+        if not node.should_return_null:
+            elements = self.temp()
+            self.emit(f"{elements} = []")
+
+        i = self.temp()
+        self.emit(f"for {i} in {counter}:")
+        with self.block(is_loop=True):
+            self.emit(f"st.symbols[{var_name!r}] = make_number({i})")
+            if node.should_return_null:
+                self.discard(node.body_node)
+            else:
+                self.emit(f"{elements}.append({self.visit(node.body_node)})")
+
+        if node.should_return_null:
+            return "NULL"
+        return self.spill(f"build_list({elements}, context, {self.position(node)})")
+
+    def visit_ForEachNode(self, node):
+        values = self.spill(
+            f"iterate({self.visit(node.iterable_node)}, context, "
+            f"{self.position(node.iterable_node)})"
+        )
+
+        if not node.should_return_null:
+            elements = self.temp()
+            self.emit(f"{elements} = []")
+
+        element = self.temp()
+        self.emit(f"for {element} in {values}:")
+        with self.block(is_loop=True):
+            self.emit(f"st.symbols[{node.var_name_tok.value!r}] = {element}")
+            if node.should_return_null:
+                self.discard(node.body_node)
+            else:
+                self.emit(f"{elements}.append({self.visit(node.body_node)})")
+
+        if node.should_return_null:
+            return "NULL"
+        return self.spill(f"build_list({elements}, context, {self.position(node)})")
+
+    def visit_WhileNode(self, node):
+        if not node.should_return_null:
+            elements = self.temp()
+            self.emit(f"{elements} = []")
+
+        self.emit("while True:")
+        with self.block(is_loop=True):
+            self.emit(f"if not {self.visit(node.condition_node)}.is_true():")
+            with self.block():
+                self.emit("break")
+            if node.should_return_null:
+                self.discard(node.body_node)
+            else:
+                self.emit(f"{elements}.append({self.visit(node.body_node)})")
+
+        if node.should_return_null:
+            return "NULL"
+        return self.spill(f"build_list({elements}, context, {self.position(node)})")
+
+    def visit_FunctionDefinitionNode(self, node):
+        func_name = node.var_name_tok.value if node.var_name_tok else None
+        arg_names = [arg_name.value for arg_name in node.arg_name_toks]
+        index = len(self.functions)
+        function_name = f"_function_{index}"
+        code_name = f"_code_{index}"
+
+        self.functions.append(None)
+        function = self.transpile_body(
+            function_name, node.body_node, True, not node.should_auto_return
+        )
+        self.functions[index] = (
+            f"{function}"
+            f"{code_name} = TranspiledCode({func_name or '<anonymous>'!r}, "
+            f"{function_name}, True)\n"
+        )
+
+        memo_name = "None"
+        if node.memo is not None:
+            # One cache per definition, like the Function objects made from
+            # it in the other backends
+            memo_name = f"_memo_{index}"
+            self.constants.append(
+                f"{memo_name} = MemoCache({node.memo.maxsize}, {node.memo.ttl!r})"
+            )
+            if node.memo_dependencies:
+                self.constants.append(
+                    f"depend_on({memo_name}, {sorted(node.memo_dependencies)!r})"
+                )
+
+        return (
+            f"make_function({func_name!r}, {arg_names!r}, {node.should_auto_return}, "
+            f"{code_name}, {memo_name}, context, {self.position(node)})"
+        )
+
+    def visit_CallNode(self, node):
+        values = self.operands([node.node_to_call] + node.arg_nodes)
+        helper = "tail_call" if node.is_tail_call else "call"
+        return (
+            f"{helper}({values[0]}, [{', '.join(values[1:])}], "
+            f"context, {self.position(node)})"
+        )
+
+    def visit_ReturnNode(self, node):
+        value = self.visit(node.node_to_return) if node.node_to_return else "NULL"
+        if self.scope.is_function:
+            self.emit(f"return {value}")
+        else:
+            self.emit(value)
+            self.emit("return None")
+        return "NULL"
+
+    def visit_ContinueNode(self, node):
+        self.jump_out_of_loop("continue")
+        return "NULL"
+
+    def visit_BreakNode(self, node):
+        self.jump_out_of_loop("break")
+        return "NULL"
+
+    def jump_out_of_loop(self, statement):
+        if self.scope.loop_depth:
+            self.emit(statement)
+        else:
+            # Outside of a loop CONTINUE and BREAK stop the current body
+            self.emit("return NULL" if self.scope.is_function else "return None")
+
+
+def source_hash(text, options):
+    key = f"{TRANSPILER_VERSION}:{options}:{text}"
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def cache_path(file_name):
+    return file_name + CACHE_SUFFIX
+
+
+def load_cached_source(file_name, text, options=""):
+    if not os.path.isfile(file_name):
+        return None
+    try:
+        with open(cache_path(file_name), "r") as f:
+            source = f.read()
+    except (OSError, UnicodeDecodeError):
+        return None
+
+    if not is_generated(source):
+        return None
+    if f"{HASH_HEADER}{source_hash(text, options)}\n" not in source:
+        return None
+    return source
+
+
+def is_generated(source):
+    lines = source.split("\n", 2)
+    return (
+        len(lines) > 2
+        and lines[0].startswith(GENERATED_HEADER)
+        and lines[1].startswith(HASH_HEADER)
+    )
+
+
+def can_write_cache(file_name):
+    path = cache_path(file_name)
+    if not os.path.exists(path):
+        return True
+    try:
+        with open(path, "r") as f:
+            return is_generated(f.read(4096))
+    except (OSError, UnicodeDecodeError):
+        return False
+
+
+def transpile_program(node, file_name, text, options=""):
+    source = Transpiler(file_name).transpile(node, source_hash(text, options))
+    if os.path.isfile(file_name) and can_write_cache(file_name):
+        try:
+            with open(cache_path(file_name), "w") as f:
+                f.write(source)
+        except OSError:
+            pass
+    return source
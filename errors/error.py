@@ -26,6 +26,15 @@ class RuntimeError(Error):
         self.context = context
         super().__init__(pos_start, pos_end, "Runtime error: ", details)
 
+    def locate(self, pos_start, pos_end, context):
+        # Values are shared between every place that reads them and carry
+        # no reliable position, so errors raised by their operations are
+        # placed at the node being evaluated
+        self.pos_start = pos_start
+        self.pos_end = pos_end
+        self.context = context
+        return self
+
     def as_string(self):
         result = self.generate_traceback()
         result += f"{self.error_name}: {self.details}"
@@ -96,6 +96,18 @@ class Lexer:
                 tokens.append(Token(TT_RPAREN, pos_start=self.pos))
                 self.advance()
 
+            elif self.current_char == "{":
+                tokens.append(Token(TT_LBRACE, pos_start=self.pos))
+                self.advance()
+
+            elif self.current_char == "}":
+                tokens.append(Token(TT_RBRACE, pos_start=self.pos))
+                self.advance()
+
+            elif self.current_char == ":":
+                tokens.append(Token(TT_COLON, pos_start=self.pos))
+                self.advance()
+
             elif self.current_char == "=":
                 tokens.append(self.make_equals())
                 self.advance()
@@ -11,6 +11,9 @@ TT_LPAREN = "LPAREN"
 TT_RPAREN = "RPAREN"
 TT_LSQUARE = "["
 TT_RSQUARE = "]"
+TT_LBRACE = "{"
+TT_RBRACE = "}"
+TT_COLON = "COLON"
 TT_STR = "STR"
 TT_EOF = "EOF"
 TT_EQ = "EQ"
@@ -39,9 +42,11 @@ KEYWORDS = [
     "ELIF",
     "FOR",
     "TO",
+    "IN",
     "STEP",
     "WHILE",
     "FUN",
+    "MEMO",
     "END",
     "RETURN",
     "CONTINUE",
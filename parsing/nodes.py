@@ -6,6 +6,9 @@ class NumberNode:
         self.pos_start = self.tok.pos_start
         self.pos_end = self.tok.pos_end
 
+        # Shared runtime value, created the first time the literal is evaluated
+        self.value = None
+
     def __repr__(self):
         return f"{self.tok}"
 
@@ -17,6 +20,8 @@ class StringNode:
         self.pos_start = self.tok.pos_start
         self.pos_end = self.tok.pos_end
 
+        self.value = None
+
     def __repr__(self):
         return f"{self.tok}"
 
@@ -28,6 +33,14 @@ class ListNode:
         self.pos_end = pos_end
 
 
+class MapNode:
+    def __init__(self, entry_nodes, pos_start, pos_end):
+        # (key node, value node) pairs, in source order
+        self.entry_nodes = entry_nodes
+        self.pos_start = pos_start
+        self.pos_end = pos_end
+
+
 class BinaryOperationNode:
     def __init__(self, left_node, op_tok, right_node):
         self.left_node = left_node
@@ -51,12 +64,25 @@ class UnaryOperationNode:
         return f"({self.op_tok}, {self.node})"
 
 
+class SliceNode:
+    def __init__(self, node, start_node, end_node, pos_end):
+        self.node = node
+        # Either bound is None when left out
+        self.start_node = start_node
+        self.end_node = end_node
+
+        self.pos_start = self.node.pos_start
+        self.pos_end = pos_end
+
+
 class VarAccessNode:
     def __init__(self, var_name_tok):
         self.var_name_tok = var_name_tok
         self.pos_start = self.var_name_tok.pos_start
         self.pos_end = self.var_name_tok.pos_end
 
+        self.slot = None
+
 
 class VarAssignNode:
     def __init__(self, var_name_tok, value_node):
@@ -66,6 +92,8 @@ class VarAssignNode:
         self.pos_start = self.var_name_tok.pos_start
         self.pos_end = self.var_name_tok.pos_end
 
+        self.slot = None
+
 
 class IfNode:
     def __init__(self, cases, else_case):
@@ -101,6 +129,24 @@ class ForNode:
 
         self.should_return_null = should_return_null
 
+        self.slot = None
+        # Set by the optimizer when the list can be built lazily
+        self.is_lazy = False
+
+
+class ForEachNode:
+    def __init__(self, var_name_tok, iterable_node, body_node, should_return_null):
+        self.var_name_tok = var_name_tok
+        self.iterable_node = iterable_node
+        self.body_node = body_node
+
+        self.pos_start = self.var_name_tok.pos_start
+        self.pos_end = self.body_node.pos_end
+
+        self.should_return_null = should_return_null
+
+        self.slot = None
+
 
 class WhileNode:
     def __init__(self, condition_node, body_node, should_return_null):
@@ -128,6 +174,12 @@ class FunctionDefinitionNode:
 
         self.pos_end = self.body_node.pos_end
 
+        self.slot = None
+        self.slot_names = None
+        self.memo = None
+        # Free names the memoized results depend on, see compiling/purity.py
+        self.memo_dependencies = None
+
 
 class CallNode:
     def __init__(self, node_to_call, arg_nodes):
@@ -141,6 +193,9 @@ class CallNode:
         else:
             self.pos_end = self.node_to_call.pos_end
 
+        # Set when the result is returned straight from the enclosing function
+        self.is_tail_call = False
+
 
 class ReturnNode:
     def __init__(self, node_to_return, pos_start, pos_end):
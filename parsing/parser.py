@@ -1,6 +1,7 @@
 from parsing.nodes import *
 from lexing.symbols import *
 from errors.error import *
+from runtime.memo import MemoCache
 
 
 class ParseResult:
@@ -132,6 +133,11 @@ class Parser:
         self.update_current_tok()
         return self.current_tok
 
+    def peek_tok(self):
+        if self.tok_idx + 1 < len(self.tokens):
+            return self.tokens[self.tok_idx + 1]
+        return self.current_tok
+
     def reverse(self, amount=1):
         self.tok_idx -= amount
         self.update_current_tok()
@@ -202,10 +208,53 @@ class Parser:
 
                 self.register_advance(res)
 
-            return res.success(CallNode(atom, arg_nodes))
+            atom = CallNode(atom, arg_nodes)
+
+        while self.current_tok.type == TT_LSQUARE:
+            atom = res.register(self.slice_expression(atom))
+            if res.error:
+                return res
 
         return res.success(atom)
 
+    def slice_expression(self, node):
+        res = ParseResult()
+        start_node = end_node = None
+        self.register_advance(res)
+
+        if self.current_tok.type != TT_COLON:
+            start_node = res.register(self.expression())
+            if res.error:
+                return res
+
+        if self.current_tok.type != TT_COLON:
+            return res.failure(
+                InvalidSyntaxError(
+                    self.current_tok.pos_start,
+                    self.current_tok.pos_end,
+                    "Expected ':'",
+                )
+            )
+        self.register_advance(res)
+
+        if self.current_tok.type != TT_RSQUARE:
+            end_node = res.register(self.expression())
+            if res.error:
+                return res
+
+        if self.current_tok.type != TT_RSQUARE:
+            return res.failure(
+                InvalidSyntaxError(
+                    self.current_tok.pos_start,
+                    self.current_tok.pos_end,
+                    "Expected ']'",
+                )
+            )
+        pos_end = self.current_tok.pos_end.copy()
+        self.register_advance(res)
+
+        return res.success(SliceNode(node, start_node, end_node, pos_end))
+
     def atom(self):
         res = ParseResult()
         tok = self.current_tok
@@ -223,6 +272,12 @@ class Parser:
                 return res
             return res.success(list_expr)
 
+        elif tok.type == TT_LBRACE:
+            map_expr = res.register(self.map_expression())
+            if res.error:
+                return res
+            return res.success(map_expr)
+
         elif tok.type == TT_STR:
             self.register_advance(res)
             return res.success(StringNode(tok))
@@ -321,6 +376,64 @@ class Parser:
             ListNode(element_nodes, pos_start, self.current_tok.pos_end.copy())
         )
 
+    def map_expression(self):
+        res = ParseResult()
+        entry_nodes = []
+        pos_start = self.current_tok.pos_start.copy()
+
+        if self.current_tok.type != TT_LBRACE:
+            return res.failure(
+                InvalidSyntaxError(
+                    self.current_tok.pos_start,
+                    self.current_tok.pos_end,
+                    "Expected '{'",
+                )
+            )
+
+        self.register_advance(res)
+
+        if self.current_tok.type == TT_RBRACE:
+            self.register_advance(res)
+        else:
+            while True:
+                key_node = res.register(self.expression())
+                if res.error:
+                    return res
+
+                if self.current_tok.type != TT_COLON:
+                    return res.failure(
+                        InvalidSyntaxError(
+                            self.current_tok.pos_start,
+                            self.current_tok.pos_end,
+                            "Expected ':'",
+                        )
+                    )
+                self.register_advance(res)
+
+                value_node = res.register(self.expression())
+                if res.error:
+                    return res
+                entry_nodes.append((key_node, value_node))
+
+                if self.current_tok.type != TT_COMMA:
+                    break
+                self.register_advance(res)
+
+            if self.current_tok.type != TT_RBRACE:
+                return res.failure(
+                    InvalidSyntaxError(
+                        self.current_tok.pos_start,
+                        self.current_tok.pos_end,
+                        "Expected ',' or '}'",
+                    )
+                )
+
+            self.register_advance(res)
+
+        return res.success(
+            MapNode(entry_nodes, pos_start, self.current_tok.pos_end.copy())
+        )
+
     def match_value_advance(self, result, token_type, value):
         if not self.current_tok.matches(token_type, value):
             return result.failure(
@@ -344,6 +457,12 @@ class Parser:
         if failure:
             return failure
 
+        memo = None
+        if self.current_tok.matches(TT_KEYWORD, "MEMO"):
+            memo = res.register(self.memo_options())
+            if res.error:
+                return res
+
         if self.current_tok.type == TT_IDENTIFIER:
             var_name_tok = self.current_tok
             self.register_advance(res)
@@ -410,11 +529,11 @@ class Parser:
             node_to_return = res.register(self.expression())
             if res.error:
                 return res
-            return res.success(
-                FunctionDefinitionNode(
-                    var_name_tok, arg_name_toks, node_to_return, True
-                )
+            func_def = FunctionDefinitionNode(
+                var_name_tok, arg_name_toks, node_to_return, True
             )
+            func_def.memo = memo
+            return res.success(func_def)
 
         if self.current_tok.type != TT_NEWLINE:
             return res.failure(
@@ -432,9 +551,57 @@ class Parser:
             return res
         self.match_value_advance(res, TT_KEYWORD, "END")
 
-        return res.success(
-            FunctionDefinitionNode(var_name_tok, arg_name_toks, body, False)
-        )
+        func_def = FunctionDefinitionNode(var_name_tok, arg_name_toks, body, False)
+        func_def.memo = memo
+        return res.success(func_def)
+
+    def memo_options(self):
+        # MEMO, MEMO(maxsize) or MEMO(maxsize, ttl), with literal numbers.
+        # In FUN MEMO (x) -> ... the parentheses hold the arguments.
+        res = ParseResult()
+        self.register_advance(res)
+        if self.current_tok.type != TT_LPAREN or self.peek_tok().type in (
+            TT_IDENTIFIER,
+            TT_RPAREN,
+        ):
+            return res.success(MemoCache())
+        self.register_advance(res)
+
+        if self.current_tok.type != TT_INT:
+            return res.failure(
+                InvalidSyntaxError(
+                    self.current_tok.pos_start,
+                    self.current_tok.pos_end,
+                    "Expected cache size",
+                )
+            )
+        maxsize = self.current_tok.value
+        self.register_advance(res)
+
+        ttl = None
+        if self.current_tok.type == TT_COMMA:
+            self.register_advance(res)
+            if self.current_tok.type not in (TT_INT, TT_FLOAT):
+                return res.failure(
+                    InvalidSyntaxError(
+                        self.current_tok.pos_start,
+                        self.current_tok.pos_end,
+                        "Expected time to live in seconds",
+                    )
+                )
+            ttl = self.current_tok.value
+            self.register_advance(res)
+
+        if self.current_tok.type != TT_RPAREN:
+            return res.failure(
+                InvalidSyntaxError(
+                    self.current_tok.pos_start,
+                    self.current_tok.pos_end,
+                    "Expected ',' or ')'",
+                )
+            )
+        self.register_advance(res)
+        return res.success(MemoCache(maxsize, ttl))
 
     def if_expr(self):
         res = ParseResult()
@@ -564,10 +731,15 @@ class Parser:
         var_name = self.current_tok
         self.register_advance(res)
 
+        if self.current_tok.matches(TT_KEYWORD, "IN"):
+            return self.for_each_expr(res, var_name)
+
         if self.current_tok.type != TT_EQ:
             return res.failure(
                 InvalidSyntaxError(
-                    self.current_tok.pos_start, self.current_tok.pos_end, "Expected '='"
+                    self.current_tok.pos_start,
+                    self.current_tok.pos_end,
+                    "Expected '=' or 'IN'",
                 )
             )
 
@@ -619,6 +791,33 @@ class Parser:
             ForNode(var_name, start_value, end_value, step_value, body, False)
         )
 
+    def for_each_expr(self, res, var_name):
+        self.register_advance(res)
+
+        iterable = res.register(self.expression())
+        if res.error:
+            return res
+
+        failure = self.match_value_advance(res, TT_KEYWORD, "THEN")
+        if failure:
+            return failure
+
+        if self.current_tok.type == TT_NEWLINE:
+            self.register_advance(res)
+            body = res.register(self.statements())
+            if res.error:
+                return res
+
+            self.match_value_advance(res, TT_KEYWORD, "END")
+
+            return res.success(ForEachNode(var_name, iterable, body, True))
+
+        body = res.register(self.expression())
+        if res.error:
+            return res
+
+        return res.success(ForEachNode(var_name, iterable, body, False))
+
     def while_expr(self):
         res = ParseResult()
 
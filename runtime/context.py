@@ -9,6 +9,27 @@ class Context:
         self.parent = parent
         self.parent_entry_pos = parent_entry_pos
         self.symbol_table = None
+        self.slots = None
+        self.slot_names = None
+        # Every name kept in a slot by this context or one it chains to.
+        # Scoping is dynamic, so any other free name can only live in the
+        # symbol table and is looked up there directly.
+        self.local_names = parent.local_names if parent else frozenset()
+
+    def lookup(self, variable_name):
+        context = self
+        while context:
+            if context.slots is not None:
+                index = context.slot_names.get(variable_name)
+                if index is not None and context.slots[index] is not None:
+                    return context.slots[index]
+            else:
+                value = context.symbol_table.symbols.get(variable_name)
+                if value is not None:
+                    return value
+            context = context.parent
+
+        return None
 
 
 class SymbolTable:
@@ -17,11 +38,14 @@ class SymbolTable:
         self.parent = parent
 
     def get(self, variable_name):
-        value = self.symbols.get(variable_name, None)
-        if value == None and self.parent:
-            return self.parent.get(variable_name)
+        symbol_table = self
+        while symbol_table:
+            value = symbol_table.symbols.get(variable_name)
+            if value is not None:
+                return value
+            symbol_table = symbol_table.parent
 
-        return value
+        return None
 
     def set(self, variable_name, value):
         self.symbols[variable_name] = value
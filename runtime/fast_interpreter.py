@@ -0,0 +1,324 @@
+from lexing.symbols import *
+from errors.error import RuntimeError
+from runtime.interpreter import (
+    RuntimeResult,
+    BINARY_OPERATIONS,
+    operation_key,
+    for_range,
+)
+from runtime.transpiled import BasicError
+import runtime.types as types
+
+
+class ReturnSignal(Exception):
+    def __init__(self, value):
+        self.value = value
+
+
+class BreakSignal(Exception):
+    pass
+
+
+class ContinueSignal(Exception):
+    pass
+
+
+class FastCode:
+    """
+    Runs a node with the FastInterpreter and converts the signals that
+    escape it back into a RuntimeResult at the function boundary.
+    """
+
+    def __init__(self, name, node, is_function):
+        self.name = name
+        self.node = node
+        self.is_function = is_function
+
+    def run(self, context):
+        res = RuntimeResult()
+        try:
+            value = FastInterpreter().visit(self.node, context)
+        except BasicError as e:
+            return res.failure(e.error)
+        except ReturnSignal as signal:
+            if self.is_function:
+                return res.success_return(signal.value)
+            return res.success(None)
+        except (BreakSignal, ContinueSignal):
+            # Outside of a loop CONTINUE and BREAK stop the current body
+            return res.success(types.Number.null if self.is_function else None)
+        return res.success(value)
+
+    def __repr__(self):
+        return f"<fast {self.name}>"
+
+
+class FastInterpreter:
+    """
+    Evaluates nodes like the Interpreter, but returns values directly.
+    Errors, RETURN, BREAK and CONTINUE are raised as exceptions and only
+    caught by loops and by FastCode.
+    """
+
+    dispatch_table = {}
+
+    def visit(self, node, context):
+        method = self.dispatch_table.get(type(node))
+        if method is None:
+            method = self.find_visit_method(type(node))
+        return method(self, node, context)
+
+    @classmethod
+    def find_visit_method(cls, node_type):
+        method_name = f"visit_{node_type.__name__}"
+        method = getattr(cls, method_name, cls.no_visit_method)
+        cls.dispatch_table[node_type] = method
+        return method
+
+    def no_visit_method(self, node, context):
+        raise Exception(f"No visit_{type(node).__name__} method defined")
+
+    def visit_NumberNode(self, node, context):
+        if node.value is None:
+            node.value = types.make_number(node.tok.value).share()
+        return node.value
+
+    def visit_StringNode(self, node, context):
+        if node.value is None:
+            node.value = types.String(node.tok.value).share()
+        return node.value
+
+    def visit_ListNode(self, node, context):
+        elements = [
+            self.visit(element_node, context) for element_node in node.element_nodes
+        ]
+        return (
+            types.List(elements)
+            .set_context(context)
+            .set_pos(node.pos_start, node.pos_end)
+        )
+
+    def visit_UnaryOperationNode(self, node, context):
+        number = self.visit(node.node, context)
+        error = None
+        if node.op_tok.type == TT_MINUS:
+            number, error = number.multiplied_by(-1)
+        elif node.op_tok.matches(TT_KEYWORD, "NOT"):
+            number, error = number.notted()
+
+        if error:
+            raise BasicError(error.locate(node.pos_start, node.pos_end, context))
+        return number
+
+    def visit_BinaryOperationNode(self, node, context):
+        left = self.visit(node.left_node, context)
+        right = self.visit(node.right_node, context)
+
+        method_name = BINARY_OPERATIONS[operation_key(node.op_tok)]
+        result, error = getattr(left, method_name)(right)
+        if error:
+            raise BasicError(error.locate(node.pos_start, node.pos_end, context))
+        return result
+
+    def visit_VarAccessNode(self, node, context):
+        var_name = node.var_name_tok.value
+        value = context.symbol_table.get(var_name)
+
+        if value is None:
+            raise BasicError(
+                RuntimeError(
+                    node.pos_start,
+                    node.pos_end,
+                    f"'{var_name}' is not defined",
+                    context,
+                )
+            )
+        return value
+
+    def visit_VarAssignNode(self, node, context):
+        value = self.visit(node.value_node, context)
+        context.symbol_table.set(node.var_name_tok.value, value)
+        return value
+
+    def visit_IfNode(self, node, context):
+        for condition, expr, should_return_null in node.cases:
+            if self.visit(condition, context).is_true():
+                expr_value = self.visit(expr, context)
+                return types.Number.null if should_return_null else expr_value
+
+        if node.else_case:
+            expr, should_return_null = node.else_case
+            else_value = self.visit(expr, context)
+            return types.Number.null if should_return_null else else_value
+
+        return types.Number.null
+
+    def visit_MapNode(self, node, context):
+        pairs = [
+            (self.visit(key_node, context), self.visit(value_node, context))
+            for key_node, value_node in node.entry_nodes
+        ]
+        map_, error = types.make_map(pairs)
+        if error:
+            raise BasicError(error.locate(node.pos_start, node.pos_end, context))
+        return map_.set_context(context).set_pos(node.pos_start, node.pos_end)
+
+    def visit_SliceNode(self, node, context):
+        value = self.visit(node.node, context)
+        bounds = [
+            None if bound_node is None else self.visit(bound_node, context)
+            for bound_node in (node.start_node, node.end_node)
+        ]
+        result, error = value.sliced(*bounds)
+        if error:
+            raise BasicError(error.locate(node.pos_start, node.pos_end, context))
+        return result
+
+    def visit_ForNode(self, node, context):
+        elements = []
+        start_value = self.visit(node.start_val_node, context)
+        end_value = self.visit(node.end_val_node, context)
+        if node.step_val_node:
+            step = self.visit(node.step_val_node, context).value
+        else:
+            step = 1
+
+        var_name = node.var_name_tok.value
+        body_node = node.body_node
+        symbols = context.symbol_table.symbols
+        should_return_null = node.should_return_null
+
+        if node.is_lazy:
+            elements = types.lazy_list(
+                start_value.value,
+                end_value.value,
+                step,
+                var_name,
+                lambda context: self.visit(body_node, context),
+            )
+            if elements.counter:
+                symbols[var_name] = types.make_number(elements.counter[-1])
+            return elements.set_context(context).set_pos(node.pos_start, node.pos_end)
+
+        for i in for_range(start_value.value, end_value.value, step):
+            symbols[var_name] = types.make_number(i)
+            try:
+                value = self.visit(body_node, context)
+            except ContinueSignal:
+                continue
+            except BreakSignal:
+                break
+            if not should_return_null:
+                elements.append(value)
+
+        if node.should_return_null:
+            return types.Number.null
+        return (
+            types.List(elements)
+            .set_context(context)
+            .set_pos(node.pos_start, node.pos_end)
+        )
+
+    def visit_ForEachNode(self, node, context):
+        elements = []
+        iterable = self.visit(node.iterable_node, context)
+        values, error = iterable.iterate()
+        if error:
+            iterable_node = node.iterable_node
+            raise BasicError(
+                error.locate(iterable_node.pos_start, iterable_node.pos_end, context)
+            )
+
+        var_name = node.var_name_tok.value
+        body_node = node.body_node
+        symbols = context.symbol_table.symbols
+        should_return_null = node.should_return_null
+
+        for element in values:
+            symbols[var_name] = element
+            try:
+                value = self.visit(body_node, context)
+            except ContinueSignal:
+                continue
+            except BreakSignal:
+                break
+            if not should_return_null:
+                elements.append(value)
+
+        if should_return_null:
+            return types.Number.null
+        return (
+            types.List(elements)
+            .set_context(context)
+            .set_pos(node.pos_start, node.pos_end)
+        )
+
+    def visit_WhileNode(self, node, context):
+        elements = []
+        should_return_null = node.should_return_null
+
+        while self.visit(node.condition_node, context).is_true():
+            try:
+                value = self.visit(node.body_node, context)
+            except ContinueSignal:
+                continue
+            except BreakSignal:
+                break
+            if not should_return_null:
+                elements.append(value)
+
+        if should_return_null:
+            return types.Number.null
+        return (
+            types.List(elements)
+            .set_context(context)
+            .set_pos(node.pos_start, node.pos_end)
+        )
+
+    def visit_FunctionDefinitionNode(self, node, context):
+        func_name = node.var_name_tok.value if node.var_name_tok else None
+        arg_names = [arg_name.value for arg_name in node.arg_name_toks]
+        code = FastCode(func_name or "<anonymous>", node.body_node, True)
+        func = (
+            types.Function(
+                func_name,
+                node.body_node,
+                arg_names,
+                node.should_auto_return,
+                code,
+                node.memo,
+            )
+            .set_context(context)
+            .set_pos(node.pos_start, node.pos_end)
+        )
+        if node.var_name_tok:
+            context.symbol_table.set(func_name, func)
+        return func
+
+    def visit_CallNode(self, node, context):
+        value_to_call = self.visit(node.node_to_call, context)
+        value_to_call = (
+            value_to_call.copy()
+            .set_pos(node.pos_start, node.pos_end)
+            .set_context(context)
+        )
+        args = [self.visit(arg_node, context) for arg_node in node.arg_nodes]
+        if node.is_tail_call and isinstance(value_to_call, types.Function):
+            return types.TailCall(value_to_call, args)
+
+        res = value_to_call.execute(args)
+        if res.error:
+            raise BasicError(res.error)
+        return res.value
+
+    def visit_ReturnNode(self, node, context):
+        value = types.Number.null
+        if node.node_to_return:
+            value = self.visit(node.node_to_return, context)
+        raise ReturnSignal(value)
+
+    def visit_ContinueNode(self, node, context):
+        raise ContinueSignal()
+
+    def visit_BreakNode(self, node, context):
+        raise BreakSignal()
@@ -1,6 +1,46 @@
 from lexing.symbols import *
+from errors.error import RuntimeError
 import runtime.types as types
 
+# Value method implementing each binary operator, keyed by operation_key
+BINARY_OPERATIONS = {
+    TT_PLUS: "added_to",
+    TT_MINUS: "subbed_by",
+    TT_MUL: "multiplied_by",
+    TT_DIV: "divided_by",
+    TT_POW: "powered_by",
+    TT_EE: "get_comparison_eq",
+    TT_NE: "get_comparison_ne",
+    TT_LT: "get_comparison_lt",
+    TT_GT: "get_comparison_gt",
+    TT_LTE: "get_comparison_lte",
+    TT_GTE: "get_comparison_gte",
+    "AND": "anded_by",
+    "OR": "ored_by",
+}
+
+
+def operation_key(op_tok):
+    return op_tok.value if op_tok.type == TT_KEYWORD else op_tok.type
+
+
+def for_range(start, end, step):
+    """The values a FOR loop counter takes, as a native range for integers"""
+    if type(start) is int and type(end) is int and type(step) is int and step != 0:
+        return range(start, end, step)
+    return count_between(start, end, step)
+
+
+def count_between(i, end, step):
+    if step >= 0:
+        while i < end:
+            yield i
+            i += step
+    else:
+        while i > end:
+            yield i
+            i += step
+
 
 class RuntimeResult:
     def __init__(self):
@@ -14,7 +54,7 @@ class RuntimeResult:
         self.loop_should_break = False
 
     def register(self, res):
-        self.error = res.should_return()
+        self.error = res.error
         self.func_return_value = res.func_return_value
         self.loop_should_continue = res.loop_should_continue
         self.loop_should_break = res.loop_should_break
@@ -55,20 +95,33 @@ class RuntimeResult:
 
 
 class Interpreter:
+    # Node type -> visit method, filled in the first time each type is seen
+    dispatch_table = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.dispatch_table = {}
+
     def visit(self, node, context):
-        method_name = f"visit_{type(node).__name__}"
-        method = getattr(self, method_name, self.no_visit_method)
-        return method(node, context)
+        method = self.dispatch_table.get(type(node))
+        if method is None:
+            method = self.find_visit_method(type(node))
+        return method(self, node, context)
+
+    @classmethod
+    def find_visit_method(cls, node_type):
+        method_name = f"visit_{node_type.__name__}"
+        method = getattr(cls, method_name, cls.no_visit_method)
+        cls.dispatch_table[node_type] = method
+        return method
 
     def no_visit_method(self, node, context):
         raise Exception(f"No visit_{type(node).__name__} method defined")
 
     def visit_NumberNode(self, node, context):
-        return RuntimeResult().success(
-            types.Number(node.tok.value)
-            .set_context(context)
-            .set_pos(node.pos_start, node.pos_end)
-        )
+        if node.value is None:
+            node.value = types.make_number(node.tok.value).share()
+        return RuntimeResult().success(node.value)
 
     def visit_UnaryOperationNode(self, node, context):
         res = RuntimeResult()
@@ -83,9 +136,9 @@ class Interpreter:
             number, error = number.notted()
 
         if error:
-            return res.failure(error)
+            return res.failure(error.locate(node.pos_start, node.pos_end, context))
         else:
-            return res.success(number.set_pos(node.pos_start, node.pos_end))
+            return res.success(number)
 
     def visit_BinaryOperationNode(self, node, context):
         res = RuntimeResult()
@@ -96,36 +149,12 @@ class Interpreter:
         if res.should_return():
             return res
 
-        if node.op_tok.type == TT_PLUS:
-            result, error = left.added_to(right)
-        elif node.op_tok.type == TT_MINUS:
-            result, error = left.subbed_by(right)
-        elif node.op_tok.type == TT_MUL:
-            result, error = left.multiplied_by(right)
-        elif node.op_tok.type == TT_DIV:
-            result, error = left.divided_by(right)
-        elif node.op_tok.type == TT_POW:
-            result, error = left.powered_by(right)
-        elif node.op_tok.type == TT_EE:
-            result, error = left.get_comparison_eq(right)
-        elif node.op_tok.type == TT_NE:
-            result, error = left.get_comparison_ne(right)
-        elif node.op_tok.type == TT_LT:
-            result, error = left.get_comparison_lt(right)
-        elif node.op_tok.type == TT_GT:
-            result, error = left.get_comparison_gt(right)
-        elif node.op_tok.type == TT_LTE:
-            result, error = left.get_comparison_lte(right)
-        elif node.op_tok.type == TT_GTE:
-            result, error = left.get_comparison_gte(right)
-        elif node.op_tok.matches(TT_KEYWORD, "AND"):
-            result, error = left.anded_by(right)
-        elif node.op_tok.matches(TT_KEYWORD, "OR"):
-            result, error = left.ored_by(right)
+        method_name = BINARY_OPERATIONS[operation_key(node.op_tok)]
+        result, error = getattr(left, method_name)(right)
         if error:
-            return res.failure(error)
+            return res.failure(error.locate(node.pos_start, node.pos_end, context))
         else:
-            return res.success(result.set_pos(node.pos_start, node.pos_end))
+            return res.success(result)
 
     def visit_VarAccessNode(self, node, context):
         res = RuntimeResult()
@@ -142,7 +171,6 @@ class Interpreter:
                 )
             )
 
-        value = value.copy().set_pos(node.pos_start, node.pos_end).set_context(context)
         return res.success(value)
 
     def visit_VarAssignNode(self, node, context):
@@ -180,11 +208,9 @@ class Interpreter:
         return res.success(types.Number.null)
 
     def visit_StringNode(self, node, context):
-        return RuntimeResult().success(
-            types.String(node.tok.value)
-            .set_context(context)
-            .set_pos(node.pos_start, node.pos_end)
-        )
+        if node.value is None:
+            node.value = types.String(node.tok.value).share()
+        return RuntimeResult().success(node.value)
 
     def visit_ListNode(self, node, context):
         res = RuntimeResult()
@@ -200,6 +226,46 @@ class Interpreter:
             .set_pos(node.pos_start, node.pos_end)
         )
 
+    def visit_MapNode(self, node, context):
+        res = RuntimeResult()
+        pairs = []
+
+        for key_node, value_node in node.entry_nodes:
+            key = res.register(self.visit(key_node, context))
+            if res.should_return():
+                return res
+            value = res.register(self.visit(value_node, context))
+            if res.should_return():
+                return res
+            pairs.append((key, value))
+
+        map_, error = types.make_map(pairs)
+        if error:
+            return res.failure(error.locate(node.pos_start, node.pos_end, context))
+        return res.success(
+            map_.set_context(context).set_pos(node.pos_start, node.pos_end)
+        )
+
+    def visit_SliceNode(self, node, context):
+        res = RuntimeResult()
+        value = res.register(self.visit(node.node, context))
+        if res.should_return():
+            return res
+
+        bounds = []
+        for bound_node in (node.start_node, node.end_node):
+            if bound_node is None:
+                bounds.append(None)
+                continue
+            bounds.append(res.register(self.visit(bound_node, context)))
+            if res.should_return():
+                return res
+
+        result, error = value.sliced(*bounds)
+        if error:
+            return res.failure(error.locate(node.pos_start, node.pos_end, context))
+        return res.success(result)
+
     def visit_ForNode(self, node, context):
         res = RuntimeResult()
         elements = []
@@ -216,19 +282,76 @@ class Interpreter:
             step_value = res.register(self.visit(node.step_val_node, context))
             if res.should_return():
                 return res
+            step = step_value.value
         else:
-            step_value = types.Number(1)
+            step = 1
 
-        i = start_value.value
+        symbols = context.symbol_table.symbols
+        var_name = node.var_name_tok.value
+        should_return_null = node.should_return_null
+
+        if node.is_lazy:
+            body_node = node.body_node
+            elements = types.lazy_list(
+                start_value.value,
+                end_value.value,
+                step,
+                var_name,
+                lambda context: self.visit(body_node, context).value,
+            )
+            if elements.counter:
+                symbols[var_name] = types.make_number(elements.counter[-1])
+            return res.success(
+                elements.set_context(context).set_pos(node.pos_start, node.pos_end)
+            )
 
-        if step_value.value >= 0:
-            condition = lambda: i < end_value.value
-        else:
-            condition = lambda: i > end_value.value
+        for i in for_range(start_value.value, end_value.value, step):
+            symbols[var_name] = types.make_number(i)
+            value = res.register(self.visit(node.body_node, context))
 
-        while condition():
-            context.symbol_table.set(node.var_name_tok.value, types.Number(i))
-            i += step_value.value
+            if (
+                res.should_return()
+                and res.loop_should_break == False
+                and res.loop_should_continue == False
+            ):
+                return res
+
+            if res.loop_should_continue:
+                continue
+
+            if res.loop_should_break:
+                break
+
+            if not should_return_null:
+                elements.append(value)
+        return res.success(
+            types.Number.null
+            if should_return_null
+            else types.List(elements)
+            .set_context(context)
+            .set_pos(node.pos_start, node.pos_end)
+        )
+
+    def visit_ForEachNode(self, node, context):
+        res = RuntimeResult()
+        elements = []
+
+        iterable = res.register(self.visit(node.iterable_node, context))
+        if res.should_return():
+            return res
+        values, error = iterable.iterate()
+        if error:
+            iterable_node = node.iterable_node
+            return res.failure(
+                error.locate(iterable_node.pos_start, iterable_node.pos_end, context)
+            )
+
+        symbols = context.symbol_table.symbols
+        var_name = node.var_name_tok.value
+        should_return_null = node.should_return_null
+
+        for element in values:
+            symbols[var_name] = element
             value = res.register(self.visit(node.body_node, context))
 
             if (
@@ -244,10 +367,11 @@ class Interpreter:
             if res.loop_should_break:
                 break
 
-            elements.append(value)
+            if not should_return_null:
+                elements.append(value)
         return res.success(
             types.Number.null
-            if node.should_return_null
+            if should_return_null
             else types.List(elements)
             .set_context(context)
             .set_pos(node.pos_start, node.pos_end)
@@ -292,7 +416,13 @@ class Interpreter:
         body_node = node.body_node
         arg_names = [arg_name.value for arg_name in node.arg_name_toks]
         func = (
-            types.Function(func_name, body_node, arg_names, node.should_auto_return)
+            types.Function(
+                func_name,
+                body_node,
+                arg_names,
+                node.should_auto_return,
+                memo=node.memo,
+            )
             .set_context(context)
             .set_pos(node.pos_start, node.pos_end)
         )
@@ -307,25 +437,28 @@ class Interpreter:
         value_to_call = res.register(self.visit(node.node_to_call, context))
         if res.should_return():
             return res
-        value_to_call = value_to_call.copy().set_pos(node.pos_start, node.pos_end)
+        value_to_call = (
+            value_to_call.copy()
+            .set_pos(node.pos_start, node.pos_end)
+            .set_context(context)
+        )
 
         for arg_node in node.arg_nodes:
             args.append(res.register(self.visit(arg_node, context)))
             if res.should_return():
                 return res
 
+        if node.is_tail_call and isinstance(value_to_call, types.Function):
+            return res.success(types.TailCall(value_to_call, args))
+
         return_value = res.register(value_to_call.execute(args))
         if res.should_return():
             return res
-        return_value = (
-            return_value.copy()
-            .set_pos(node.pos_start, node.pos_end)
-            .set_context(context)
-        )
         return res.success(return_value)
 
     def visit_ReturnNode(self, node, context):
         res = RuntimeResult()
+        value = types.Number.null
         if node.node_to_return:
             value = res.register(self.visit(node.node_to_return, context))
             if res.should_return():
@@ -337,4 +470,4 @@ class Interpreter:
         return RuntimeResult().success_continue()
 
     def visit_BreakNode(self, node, context):
-        return RuntimeResult().success_continue()
+        return RuntimeResult().success_break()
@@ -0,0 +1,109 @@
+from collections import OrderedDict
+import time
+import weakref
+
+DEFAULT_MAXSIZE = 1024
+
+# The caches of functions memoized because they are pure, under each free
+# name their results depend on. Scoping is dynamic, so a program run later
+# that binds one of these names, even as a parameter, can change what the
+# function computes.
+DEPENDENT_MEMOS = {}
+
+
+class MemoCache:
+    """
+    Least recently used cache of a function's results, keyed on its
+    argument values. Shared by every Function made from one definition.
+    With a ttl, results are dropped that many seconds after being stored.
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        value, expires_at = entry
+        if expires_at is not None and time.monotonic() >= expires_at:
+            del self.entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        expires_at = None if self.ttl is None else time.monotonic() + self.ttl
+        self.entries[key] = (value, expires_at)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+
+    def disable(self):
+        # Results stored from now on would not be reused, so none are stored
+        self.maxsize = 0
+        self.entries.clear()
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "size": len(self.entries),
+            "maxsize": self.maxsize,
+        }
+
+    def __repr__(self):
+        return f"<memo cache {self.stats()}>"
+
+
+def depend_on(memo, names):
+    for name in names:
+        DEPENDENT_MEMOS.setdefault(name, weakref.WeakSet()).add(memo)
+
+
+def forget_names(names):
+    """Disables the caches that depend on any of the names"""
+    for name in names:
+        for memo in DEPENDENT_MEMOS.pop(name, ()):
+            memo.disable()
+
+
+def arguments_key(args):
+    """The cache key for a call, or None if an argument has no stable value"""
+    keys = []
+    for arg in args:
+        key = arg.memo_key()
+        if key is None:
+            return None
+        keys.append(key)
+    return tuple(keys)
+
+
+def remember(pending, value):
+    """Stores a call's result under the keys of every call waiting on it"""
+    if value.memo_key() is None:
+        # Only immutable results can be handed to later callers
+        return
+    value.share()
+    for memo, key in pending:
+        memo.put(key, value)
@@ -4,6 +4,14 @@ from parsing.parser import Parser
 from runtime.types import *
 from runtime.context import Context, SymbolTable
 from runtime.interpreter import Interpreter
+from runtime.fast_interpreter import FastCode
+from compiling.compiler import Compiler
+from compiling.closures import ClosureCompiler
+from runtime.transpiled import load_program
+from compiling.optimizer import optimize
+from compiling.purity import bound_names
+from runtime.memo import forget_names
+import compiling.transpiler as transpiler
 
 
 global_symbol_table = SymbolTable()
@@ -25,9 +33,27 @@ global_symbol_table.set("POP", BuiltInFunction.pop)
 global_symbol_table.set("EXTEND", BuiltInFunction.extend)
 global_symbol_table.set("LEN", BuiltInFunction.len)
 global_symbol_table.set("RUN", BuiltInFunction.run)
+global_symbol_table.set("CACHE_STATS", BuiltInFunction.cache_stats)
+global_symbol_table.set("VECTOR", BuiltInFunction.vector)
+global_symbol_table.set("VRANGE", BuiltInFunction.vrange)
+global_symbol_table.set("RANGE", BuiltInFunction.range)
+global_symbol_table.set("SUM", BuiltInFunction.sum)
+global_symbol_table.set("MIN", BuiltInFunction.min)
+global_symbol_table.set("MAX", BuiltInFunction.max)
+global_symbol_table.set("SORT", BuiltInFunction.sort)
+global_symbol_table.set("SORT_BY", BuiltInFunction.sort_by)
+global_symbol_table.set("MAP", BuiltInFunction.map)
+global_symbol_table.set("FILTER", BuiltInFunction.filter)
+global_symbol_table.set("REDUCE", BuiltInFunction.reduce)
+global_symbol_table.set("PUT", BuiltInFunction.put)
+global_symbol_table.set("HAS", BuiltInFunction.has)
+global_symbol_table.set("STRBUILDER", BuiltInFunction.strbuilder)
+global_symbol_table.set("STR", BuiltInFunction.str)
+global_symbol_table.set("SLICE", BuiltInFunction.slice)
+global_symbol_table.set("SUBSTR", BuiltInFunction.substr)
 
 
-def run(file_name, text):
+def parse(file_name, text, should_optimize):
     lexer = Lexer(file_name, text)
     tokens, error = lexer.make_tokens()
 
@@ -38,10 +64,42 @@ def run(file_name, text):
     ast = parser.parse()
 
     if ast.error:
-        return None, ast.error
+        return ast.node, ast.error
+    # Results cached by functions of earlier programs may depend on names
+    # this one rebinds
+    forget_names(bound_names(ast.node))
+    if not should_optimize:
+        return ast.node, None
+    return optimize(ast.node), None
 
-    interpreter = Interpreter()
+
+def run(file_name, text, mode="vm", should_optimize=True):
     context = Context("<program>")
     context.symbol_table = global_symbol_table
-    result = interpreter.visit(ast.node, context)
+
+    if mode == "python":
+        options = f"optimize={should_optimize}"
+        source = transpiler.load_cached_source(file_name, text, options)
+        if source is None:
+            node, error = parse(file_name, text, should_optimize)
+            if error or not node:
+                return None, error
+            source = transpiler.transpile_program(node, file_name, text, options)
+        result = load_program(source, file_name, text).run(context)
+        return result.value, result.error
+
+    node, error = parse(file_name, text, should_optimize)
+    if error or not node:
+        return None, error
+
+    if mode == "vm":
+        result = Compiler().compile(node).run(context)
+    elif mode == "closure":
+        result = ClosureCompiler().compile(node).run(context)
+    elif mode == "fast":
+        result = FastCode("<program>", node, False).run(context)
+    elif mode == "ast":
+        result = Interpreter().visit(node, context)
+    else:
+        raise Exception(f"Unknown execution mode '{mode}'")
     return result.value, result.error
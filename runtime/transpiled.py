@@ -0,0 +1,181 @@
+from errors.error import RuntimeError
+from lexing.lexer import Position
+from runtime.interpreter import RuntimeResult, for_range
+from runtime.memo import MemoCache, depend_on, forget_names
+from runtime.types import (
+    Number,
+    String,
+    List,
+    Function,
+    TailCall,
+    make_number,
+    make_map,
+    lazy_list,
+)
+
+__all__ = [
+    "NULL",
+    "TranspiledCode",
+    "MemoCache",
+    "depend_on",
+    "forget_names",
+    "make_number",
+    "for_range",
+    "lazy_list",
+    "number_constant",
+    "string_constant",
+    "load_name",
+    "store_name",
+    "binary_operation",
+    "unary_minus",
+    "unary_not",
+    "build_list",
+    "build_map",
+    "slice_value",
+    "iterate",
+    "call",
+    "tail_call",
+    "make_function",
+]
+
+NULL = Number.null
+
+
+class BasicError(Exception):
+    def __init__(self, error):
+        super().__init__(error.details)
+        self.error = error
+
+
+class TranspiledCode:
+    def __init__(self, name, function, is_function):
+        self.name = name
+        self.function = function
+        self.is_function = is_function
+
+    def run(self, context):
+        res = RuntimeResult()
+        try:
+            value = self.function(context)
+        except BasicError as e:
+            return res.failure(e.error)
+        if self.is_function:
+            return res.success_return(value)
+        return res.success(value)
+
+    def __repr__(self):
+        return f"<transpiled {self.name}>"
+
+
+def load_program(source, file_name, text):
+    namespace = {}
+    exec(compile(source, f"<transpiled {file_name}>", "exec"), namespace)
+    namespace["P"] = [
+        (
+            Position(start_idx, start_ln, start_col, file_name, text),
+            Position(end_idx, end_ln, end_col, file_name, text),
+        )
+        for start_idx, start_ln, start_col, end_idx, end_ln, end_col in namespace[
+            "LINE_TABLE"
+        ]
+    ]
+    return TranspiledCode("<program>", namespace["__program__"], False)
+
+
+def number_constant(value):
+    return make_number(value).share()
+
+
+def string_constant(value):
+    return String(value).share()
+
+
+def load_name(symbol_table, var_name, context, positions):
+    value = symbol_table.get(var_name)
+    if not value:
+        raise BasicError(
+            RuntimeError(*positions, f"'{var_name}' is not defined", context)
+        )
+    return value
+
+
+def store_name(symbol_table, var_name, value):
+    symbol_table.set(var_name, value)
+    return value
+
+
+def binary_operation(left, right, method_name, context, positions):
+    result, error = getattr(left, method_name)(right)
+    if error:
+        raise BasicError(error.locate(*positions, context))
+    return result
+
+
+def unary_minus(value, context, positions):
+    result, error = value.multiplied_by(-1)
+    if error:
+        raise BasicError(error.locate(*positions, context))
+    return result
+
+
+def unary_not(value, context, positions):
+    result, error = value.notted()
+    if error:
+        raise BasicError(error.locate(*positions, context))
+    return result
+
+
+def build_list(elements, context, positions):
+    return List(elements).set_context(context).set_pos(*positions)
+
+
+def build_map(pairs, context, positions):
+    map_, error = make_map(pairs)
+    if error:
+        raise BasicError(error.locate(*positions, context))
+    return map_.set_context(context).set_pos(*positions)
+
+
+def slice_value(value, start, end, context, positions):
+    result, error = value.sliced(start, end)
+    if error:
+        raise BasicError(error.locate(*positions, context))
+    return result
+
+
+def iterate(value, context, positions):
+    values, error = value.iterate()
+    if error:
+        raise BasicError(error.locate(*positions, context))
+    return values
+
+
+def call(value_to_call, args, context, positions):
+    callee = value_to_call.copy().set_pos(*positions).set_context(context)
+    res = callee.execute(args)
+    if res.error:
+        raise BasicError(res.error)
+    return res.value
+
+
+def tail_call(value_to_call, args, context, positions):
+    callee = value_to_call.copy().set_pos(*positions).set_context(context)
+    if isinstance(callee, Function):
+        return TailCall(callee, args)
+    res = callee.execute(args)
+    if res.error:
+        raise BasicError(res.error)
+    return res.value
+
+
+def make_function(
+    func_name, arg_names, should_auto_return, code, memo, context, positions
+):
+    func = (
+        Function(func_name, None, arg_names, should_auto_return, code, memo)
+        .set_context(context)
+        .set_pos(*positions)
+    )
+    if func_name:
+        context.symbol_table.set(func_name, func)
+    return func
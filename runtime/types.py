@@ -1,20 +1,38 @@
-from runtime.interpreter import RuntimeResult, Interpreter
+from runtime.interpreter import RuntimeResult, Interpreter, for_range
 from runtime.context import Context, SymbolTable
+from runtime.memo import arguments_key, remember
+from errors.error import RuntimeError
+from itertools import islice, repeat
+from array import array
 import runtime.runner as runner
+import operator
 import os
 
 
 class Value:
+    # Shared values (cached small integers, literals attached to nodes) are
+    # never modified, so setting their position or context makes a copy
+    is_shared = False
+
     def __init__(self):
-        self.set_pos()
-        self.set_context()
+        self.pos_start = None
+        self.pos_end = None
+        self.context = None
+
+    def share(self):
+        self.is_shared = True
+        return self
 
     def set_pos(self, pos_start=None, pos_end=None):
+        if self.is_shared:
+            return self.copy().set_pos(pos_start, pos_end)
         self.pos_start = pos_start
         self.pos_end = pos_end
         return self
 
     def set_context(self, context=None):
+        if self.is_shared:
+            return self.copy().set_context(context)
         self.context = context
         return self
 
@@ -70,6 +88,32 @@ class Value:
     def notted(self):
         return None, self.illegal_operation()
 
+    def iterate(self):
+        # The elements a FOR ... IN loop visits, as a Python iterator
+        return None, self.illegal_operation()
+
+    def sliced(self, start, end):
+        # x[start:end]; either bound is None when left out
+        return None, self.illegal_operation()
+
+    def slice_bounds(self, start, end):
+        """The offset and size of the part from start to end, or an error"""
+        bounds = []
+        for bound in (start, end):
+            if bound is not None and not (
+                isinstance(bound, Number) and type(bound.value) is int
+            ):
+                return None, RuntimeError(
+                    bound.pos_start,
+                    bound.pos_end,
+                    "Slice bounds must be integers",
+                    self.context,
+                )
+            bounds.append(None if bound is None else bound.value)
+
+        offset, stop, _ = slice(*bounds).indices(self.length())
+        return (offset, max(stop - offset, 0)), None
+
     def execute(self, args):
         return RuntimeResult().failure(self.illegal_operation())
 
@@ -79,6 +123,11 @@ class Value:
     def is_true(self):
         return False
 
+    def memo_key(self):
+        # Key for this value as a memoized function argument, or None when
+        # the value can change after the call
+        return None
+
 
 class Number(Value):
     def __init__(self, value):
@@ -87,35 +136,43 @@ class Number(Value):
 
     def added_to(self, other):
         if isinstance(other, Number):
-            return Number(self.value + other.value).set_context(self.context), None
+            return make_number(self.value + other.value), None
         elif isinstance(other, int) or isinstance(other, float):
-            return Number(self.value + other).set_context(self.context), None
+            return make_number(self.value + other), None
+        elif isinstance(other, Vector):
+            return other.operate(self, operator.add, is_reflected=True)
         else:
             return None, Value.illegal_operation(self, other)
 
     def subbed_by(self, other):
         if isinstance(other, Number):
-            return Number(self.value - other.value).set_context(self.context), None
+            return make_number(self.value - other.value), None
         elif isinstance(other, int) or isinstance(other, float):
-            return Number(self.value - other).set_context(self.context), None
+            return make_number(self.value - other), None
+        elif isinstance(other, Vector):
+            return other.operate(self, operator.sub, is_reflected=True)
         else:
             return None, Value.illegal_operation(self, other)
 
     def multiplied_by(self, other):
         if isinstance(other, Number):
-            return Number(self.value * other.value).set_context(self.context), None
+            return make_number(self.value * other.value), None
         elif isinstance(other, int) or isinstance(other, float):
-            return Number(self.value * other).set_context(self.context), None
+            return make_number(self.value * other), None
         elif isinstance(other, String):
-            return String(other.value * self.value).set_context(self.context), None
+            return String(other.value * self.value), None
+        elif isinstance(other, Vector):
+            return other.operate(self, operator.mul, is_reflected=True)
         else:
             return None, Value.illegal_operation(self, other)
 
     def powered_by(self, other):
         if isinstance(other, Number):
-            return Number(self.value**other.value).set_context(self.context), None
+            return make_number(self.value**other.value), None
         elif isinstance(other, int) or isinstance(other, float):
-            return Number(self.value**other).set_context(self.context), None
+            return make_number(self.value**other), None
+        elif isinstance(other, Vector):
+            return other.operate(self, operator.pow, is_reflected=True)
         else:
             return None, Value.illegal_operation(self, other)
 
@@ -125,88 +182,76 @@ class Number(Value):
                 return None, RuntimeError(
                     other.pos_start, other.pos_end, "Divison by 0", self.context
                 )
-            return (Number(self.value / other.value).set_context(self.context), None)
+            return make_number(self.value / other.value), None
         elif isinstance(other, int) or isinstance(other, float):
             if other == 0:
                 return None, RuntimeError(
                     other.pos_start, other.pos_end, "Divison by 0", self.context
                 )
-            return (Number(self.value / other).set_context(self.context), None)
+            return make_number(self.value / other), None
+        elif isinstance(other, Vector):
+            return other.operate(self, operator.truediv, is_reflected=True)
         else:
             return None, Value.illegal_operation(self, other)
 
     def get_comparison_eq(self, other):
         if isinstance(other, Number):
-            return (
-                Number(int(self.value == other.value)).set_context(self.context),
-                None,
-            )
+            return make_number(int(self.value == other.value)), None
         else:
             return None, Value.illegal_operation(self, other)
 
     def ok(self, other):
         if isinstance(other, Number):
-            return (
-                Number(int(self.value != other.value)).set_context(self.context),
-                None,
-            )
+            return make_number(int(self.value != other.value)), None
         else:
             return None, Value.illegal_operation(self, other)
 
     def get_comparison_gt(self, other):
         if isinstance(other, Number):
-            return Number(int(self.value > other.value)).set_context(self.context), None
+            return make_number(int(self.value > other.value)), None
         else:
             return None, Value.illegal_operation(self, other)
 
     def get_comparison_lte(self, other):
         if isinstance(other, Number):
-            return (
-                Number(int(self.value <= other.value)).set_context(self.context),
-                None,
-            )
+            return make_number(int(self.value <= other.value)), None
         else:
             return None, Value.illegal_operation(self, other)
 
     def get_comparison_gte(self, other):
         if isinstance(other, Number):
-            return (
-                Number(int(self.value >= other.value)).set_context(self.context),
-                None,
-            )
+            return make_number(int(self.value >= other.value)), None
         else:
             return None, Value.illegal_operation(self, other)
 
     def anded_by(self, other):
         if isinstance(other, Number):
-            return (
-                Number(int(self.value and other.value)).set_context(self.context),
-                None,
-            )
+            return make_number(int(self.value and other.value)), None
         else:
             return None, Value.illegal_operation(self, other)
 
     def ored_by(self, other):
         if isinstance(other, Number):
-            return (
-                Number(int(self.value or other.value)).set_context(self.context),
-                None,
-            )
+            return make_number(int(self.value or other.value)), None
         else:
             return None, Value.illegal_operation(self, other)
 
     def notted(self):
-        return Number(1 if self.value == 0 else 0).set_context(self.context), None
+        return make_number(1 if self.value == 0 else 0), None
 
     def get_comparison_lt(self, other):
         if isinstance(other, Number):
-            return Number(int(self.value < other.value)).set_context(self.context), None
+            return make_number(int(self.value < other.value)), None
         else:
             return None, Value.illegal_operation(self, other)
 
     def is_true(self):
         return self.value != 0
 
+    def memo_key(self):
+        # 1 and 1.0 print differently, so they must not share an entry
+        return (type(self.value), self.value)
+
     def copy(self):
         copy = Number(self.value)
         copy.set_pos(self.pos_start, self.pos_end)
@@ -217,37 +262,113 @@ class Number(Value):
         return str(self.value)
 
 
-Number.null = Number(0)
-Number.false = Number(0)
-Number.true = Number(1)
+SMALL_INT_MIN = -5
+SMALL_INT_MAX = 1024
+Number.small_ints = [
+    Number(value).share() for value in range(SMALL_INT_MIN, SMALL_INT_MAX + 1)
+]
+
+
+def make_number(value):
+    if type(value) is int and SMALL_INT_MIN <= value <= SMALL_INT_MAX:
+        return Number.small_ints[value - SMALL_INT_MIN]
+    return Number(value)
+
+
+Number.null = make_number(0)
+Number.false = make_number(0)
+Number.true = make_number(1)
+
+
+# Strings at least this long are concatenated by collecting the pieces and
+# joining them only when the text is needed
+ROPE_THRESHOLD = 1024
 
 
 class String(Value):
     def __init__(self, value):
         super().__init__()
         self.value = value
+        # Set once the string is concatenated past ROPE_THRESHOLD. Like a
+        # list's buffer, strings made from this one by + append their
+        # pieces to the same Python list and each joins its first count
+        self.pieces = None
+        self.count = 0
+
+    @property
+    def value(self):
+        if self.text is None:
+            self.text = "".join(self.pieces[: self.count])
+        return self.text
+
+    @value.setter
+    def value(self, value):
+        self.text = value
+        self.size = len(value)
+
+    def concatenated(self, text):
+        if self.pieces is None:
+            if self.size + len(text) < ROPE_THRESHOLD:
+                return String(self.value + text)
+            pieces, count = [self.value], 1
+            if not self.is_shared:
+                self.pieces, self.count = pieces, count
+        elif self.is_shared or len(self.pieces) != self.count:
+            # Shared strings are never changed, and otherwise a string made
+            # from this one has appended past its end
+            pieces, count = self.pieces[: self.count], self.count
+        else:
+            pieces, count = self.pieces, self.count
+        pieces.append(text)
+        return self.rope(pieces, count + 1, self.size + len(text))
+
+    def rope(self, pieces, count, size):
+        string = String("")
+        string.text = self.text if count == self.count else None
+        string.size = size
+        string.pieces = pieces
+        string.count = count
+        return string
 
     def added_to(self, other):
         if isinstance(other, String):
-            return String(self.value + other.value).set_context(self.context), None
+            return self.concatenated(other.value), None
         elif isinstance(other, str):
-            return String(self.value + other).set_context(self.context), None
+            return self.concatenated(other), None
         else:
             return None, Value.illegal_operation(self, other)
 
     def multiplied_by(self, other):
         if isinstance(other, Number):
-            return String(self.value * other.value).set_context(self.context), None
+            return String(self.value * other.value), None
         elif isinstance(other, int):
-            return String(self.value * other).set_context(self.context), None
+            return String(self.value * other), None
         else:
             return None, Value.illegal_operation(self, other)
 
     def is_true(self):
-        return len(self.value) > 0
+        return self.size > 0
+
+    def length(self):
+        return self.size
+
+    def iterate(self):
+        return map(String, self.value), None
+
+    def sliced(self, start, end):
+        bounds, error = self.slice_bounds(start, end)
+        if error:
+            return None, error
+        return StringSlice(self.value, *bounds), None
+
+    def memo_key(self):
+        return self.value
 
     def copy(self):
-        copy = String(self.value)
+        if self.pieces is None:
+            copy = String(self.text)
+        else:
+            copy = self.rope(self.pieces, self.count, self.size)
         copy.set_pos(self.pos_start, self.pos_end)
         copy.set_context(self.context)
         return copy
@@ -256,35 +377,135 @@ class String(Value):
         return str(self.value)
 
 
+class StringSlice(String):
+    """
+    The size characters of a Python string from offset, copied out the
+    first time the text is read. Slicing, LEN and FOR ... IN read the
+    characters in place.
+    """
+
+    def __init__(self, source, offset, size):
+        Value.__init__(self)
+        self.source = source
+        self.offset = offset
+        self.text = None
+        self.size = size
+        self.pieces = None
+        self.count = 0
+
+    @property
+    def value(self):
+        if self.text is None:
+            self.text = self.source[self.offset : self.offset + self.size]
+        return self.text
+
+    @value.setter
+    def value(self, value):
+        String.value.fset(self, value)
+
+    def iterate(self):
+        if self.text is not None:
+            return super().iterate()
+        characters = islice(self.source, self.offset, self.offset + self.size)
+        return map(String, characters), None
+
+    def sliced(self, start, end):
+        if self.text is not None:
+            return super().sliced(start, end)
+        bounds, error = self.slice_bounds(start, end)
+        if error:
+            return None, error
+        offset, size = bounds
+        return StringSlice(self.source, self.offset + offset, size), None
+
+    def copy(self):
+        if self.text is not None:
+            return super().copy()
+        copy = StringSlice(self.source, self.offset, self.size)
+        copy.set_pos(self.pos_start, self.pos_end)
+        copy.set_context(self.context)
+        return copy
+
+
 class List(Value):
     def __init__(self, elements):
         super().__init__()
         self.elements = elements
+        # Set on a list and its copies while they still share one Python
+        # list; the first of them to be mutated takes its own
+        self.shares_elements = False
+
+    # A list made from another by + or by removing its last element keeps
+    # using the other's Python list. The longer of them appends to it in
+    # place and each only reads its first size elements, so building a list
+    # with l = l + x doesn't copy it every time.
+    @property
+    def elements(self):
+        if len(self.buffer) != self.size:
+            # A list made from this one has appended past its end
+            self.buffer = self.buffer[: self.size]
+            self.shares_elements = False
+        return self.buffer
+
+    @elements.setter
+    def elements(self, elements):
+        self.buffer = elements
+        self.size = len(elements)
+
+    def own_elements(self):
+        if self.shares_elements:
+            self.elements = list(self.elements)
+            self.shares_elements = False
+        return self.elements
+
+    def append(self, value):
+        self.own_elements().append(value)
+        self.size += 1
+
+    def pop(self, index):
+        element = self.own_elements().pop(index)
+        self.size -= 1
+        return element
+
+    def extend(self, elements):
+        self.own_elements().extend(elements)
+        self.size = len(self.buffer)
+
+    def shared_prefix(self, elements, size):
+        # A list of the first size items of elements, which this list uses
+        prefix = List(elements)
+        prefix.size = size
+        self.shares_elements = prefix.shares_elements = True
+        return prefix
 
     def added_to(self, other):
         if isinstance(other, List):
-            return List(self.elements + other.elements), None
+            other = other.elements
+        elif not isinstance(other, list):
+            other = [other]
 
-        if isinstance(other, list):
-            return List(self.elements + other), None
-
-        new_list = self.copy()
-        new_list.elements.append(other)
-        return new_list, None
+        elements = self.elements
+        elements.extend(other)
+        return self.shared_prefix(elements, len(elements)), None
 
     def subbed_by(self, other):
         if isinstance(other, Number):
-            new_list = self.copy()
+            elements = self.elements
+            index = other.value
+            if type(index) is int and elements and index in (-1, len(elements) - 1):
+                return self.shared_prefix(elements, len(elements) - 1), None
+
+            elements = list(elements)
             try:
-                new_list.elements.pop(other.value)
-                return new_list, None
-            except:
-                return RuntimeError(
+                elements.pop(index)
+            except (IndexError, TypeError):
+                return None, RuntimeError(
                     other.pos_start,
                     other.pos_end,
                     f"Incorrect index when trying to remove from list:{other.value}",
                     self.context,
                 )
+            return List(elements), None
         else:
             return None, Value.illegal_operation(self, other)
 
@@ -292,24 +513,439 @@ class List(Value):
         if isinstance(other, Number):
             try:
                 return self.elements[other.value], None
-            except:
-                return RuntimeError(
-                    other.pos_start,
+            except (IndexError, TypeError):
+                return None, self.index_error(other)
+        else:
+            return None, Value.illegal_operation(self, other)
+
+    def index_error(self, index):
+        return RuntimeError(
+            index.pos_start,
+            index.pos_end,
+            f"Incorrect index when trying to access element at index:{index.value}",
+            self.context,
+        )
+
+    def length(self):
+        return self.size
+
+    def iterate(self):
+        # The loop keeps reading the elements as they were when it started;
+        # a mutation in its body takes a copy first
+        self.shares_elements = True
+        return islice(self.elements, self.size), None
+
+    def sliced(self, start, end):
+        bounds, error = self.slice_bounds(start, end)
+        if error:
+            return None, error
+        # Like a loop, the slice keeps reading the elements as they are now
+        elements = self.elements
+        self.shares_elements = True
+        return ListSlice(elements, *bounds), None
+
+    def copy(self):
+        copy = List(self.elements)
+        copy.set_pos(self.pos_start, self.pos_end)
+        copy.set_context(self.context)
+        self.shares_elements = copy.shares_elements = True
+        return copy
+
+    def __repr__(self):
+        return f'[{", ".join([str(x) for x in self.elements])}]'
+
+
+class ListSlice(List):
+    """
+    The size elements of a Python list from offset, shared with the list it
+    was sliced from, which copies them before changing. The slice copies
+    them out only when it needs a Python list of its own, such as when it
+    is changed with APPEND, POP or EXTEND.
+    """
+
+    def __init__(self, source, offset, size):
+        Value.__init__(self)
+        self.source = source
+        self.offset = offset
+        self.buffer = None
+        self.size = size
+        self.shares_elements = False
+
+    @property
+    def elements(self):
+        if self.buffer is None:
+            self.buffer = self.source[self.offset : self.offset + self.size]
+        return List.elements.fget(self)
+
+    @elements.setter
+    def elements(self, elements):
+        List.elements.fset(self, elements)
+
+    def divided_by(self, other):
+        if self.buffer is not None or not isinstance(other, Number):
+            return super().divided_by(other)
+        index = other.value
+        size = self.size
+        if type(index) is not int or not -size <= index < size:
+            return None, self.index_error(other)
+        return self.source[self.offset + index % size], None
+
+    def iterate(self):
+        if self.buffer is not None:
+            return super().iterate()
+        return islice(self.source, self.offset, self.offset + self.size), None
+
+    def sliced(self, start, end):
+        if self.buffer is not None:
+            return super().sliced(start, end)
+        bounds, error = self.slice_bounds(start, end)
+        if error:
+            return None, error
+        offset, size = bounds
+        return ListSlice(self.source, self.offset + offset, size), None
+
+    def copy(self):
+        if self.buffer is not None:
+            return super().copy()
+        copy = ListSlice(self.source, self.offset, self.size)
+        copy.set_pos(self.pos_start, self.pos_end)
+        copy.set_context(self.context)
+        return copy
+
+
+class LazyList(List):
+    """
+    The list made by a FOR loop whose body only computes a number from the
+    counter, or by RANGE, whose elements are the counter values themselves.
+    Each element is evaluated the first time it is read and then kept;
+    anything that needs the Python list of elements computes them all.
+    """
+
+    def __init__(self, counter, var_name, evaluate):
+        Value.__init__(self)
+        self.counter = counter
+        self.var_name = var_name
+        self.evaluate = evaluate
+        self.computed = {}
+        self.buffer = None
+        self.size = len(counter)
+        self.shares_elements = False
+        # The body reads nothing but the counter, so every element can be
+        # evaluated in the same context
+        self.element_context = Context("<lazy list>")
+        self.element_context.symbol_table = SymbolTable()
+
+    @property
+    def elements(self):
+        if self.buffer is None:
+            evaluate_all = getattr(self.evaluate, "evaluate_all", None)
+            if evaluate_all is not None:
+                self.buffer = evaluate_all(self.element_context, self.counter)
+            else:
+                self.buffer = list(map(self.element_at, range(self.size)))
+        return List.elements.fget(self)
+
+    @elements.setter
+    def elements(self, elements):
+        List.elements.fset(self, elements)
+
+    def element_at(self, index):
+        if self.evaluate is None:
+            return make_number(self.counter[index])
+        value = self.computed.get(index)
+        if value is None:
+            context = self.element_context
+            context.symbol_table.symbols[self.var_name] = make_number(
+                self.counter[index]
+            )
+            value = self.computed[index] = self.evaluate(context)
+        return value
+
+    def divided_by(self, other):
+        if self.buffer is not None or not isinstance(other, Number):
+            return super().divided_by(other)
+        index = other.value
+        size = self.size
+        if type(index) is not int or not -size <= index < size:
+            return None, self.index_error(other)
+        return self.element_at(index % size), None
+
+    def iterate(self):
+        if self.buffer is not None:
+            return super().iterate()
+        return map(self.element_at, range(self.size)), None
+
+    def sliced(self, start, end):
+        if self.buffer is not None:
+            return super().sliced(start, end)
+        bounds, error = self.slice_bounds(start, end)
+        if error:
+            return None, error
+        offset, size = bounds
+        counter = self.counter[offset : offset + size]
+        return LazyList(counter, self.var_name, self.evaluate), None
+
+    def copy(self):
+        if self.buffer is not None:
+            return super().copy()
+        # Computed elements never change, so copies can share them
+        copy = LazyList(self.counter, self.var_name, self.evaluate)
+        copy.computed = self.computed
+        copy.set_pos(self.pos_start, self.pos_end)
+        copy.set_context(self.context)
+        return copy
+
+
+def lazy_list(start, end, step, var_name, evaluate):
+    """
+    The LazyList of a FOR loop marked lazy. evaluate computes the body in a
+    context where var_name is bound to the counter.
+    """
+    counter = for_range(start, end, step)
+    if not isinstance(counter, range):
+        counter = list(counter)
+    return LazyList(counter, var_name, evaluate)
+
+
+class Vector(Value):
+    """
+    A fixed length sequence of numbers stored unboxed in an array, of 64 bit
+    integers while every element is an integer. Arithmetic and comparisons
+    apply element by element, to another vector of the same length or to a
+    number, in one pass over the arrays.
+    """
+
+    def __init__(self, values):
+        super().__init__()
+        self.values = values
+
+    def operate(self, other, operation, is_reflected=False):
+        values = self.values
+        if isinstance(other, Vector):
+            if len(other.values) != len(values):
+                return None, RuntimeError(
+                    self.pos_start,
                     other.pos_end,
-                    f"Incorrect index when trying to access element at index:{other.value}",
+                    "Vectors must have the same length",
                     self.context,
                 )
+            others = other.values
+        elif isinstance(other, Number):
+            others = repeat(other.value, len(values))
+        elif isinstance(other, (int, float)):
+            others = repeat(other, len(values))
         else:
             return None, Value.illegal_operation(self, other)
 
+        if is_reflected:
+            values, others = others, values
+        try:
+            return make_vector(map(operation, values, others)), None
+        except ZeroDivisionError:
+            return None, RuntimeError(
+                self.pos_start, self.pos_end, "Divison by 0", self.context
+            )
+        except (OverflowError, TypeError):
+            return None, RuntimeError(
+                self.pos_start,
+                self.pos_end,
+                "Result can't be stored in a vector",
+                self.context,
+            )
+
+    def added_to(self, other):
+        return self.operate(other, operator.add)
+
+    def subbed_by(self, other):
+        return self.operate(other, operator.sub)
+
+    def multiplied_by(self, other):
+        return self.operate(other, operator.mul)
+
+    def divided_by(self, other):
+        return self.operate(other, operator.truediv)
+
+    def powered_by(self, other):
+        return self.operate(other, operator.pow)
+
+    def get_comparison_eq(self, other):
+        return self.operate(other, operator.eq)
+
+    def get_comparison_ne(self, other):
+        return self.operate(other, operator.ne)
+
+    def get_comparison_lt(self, other):
+        return self.operate(other, operator.lt)
+
+    def get_comparison_gt(self, other):
+        return self.operate(other, operator.gt)
+
+    def get_comparison_lte(self, other):
+        return self.operate(other, operator.le)
+
+    def get_comparison_gte(self, other):
+        return self.operate(other, operator.ge)
+
+    def length(self):
+        return len(self.values)
+
+    def iterate(self):
+        return map(make_number, self.values), None
+
     def copy(self):
-        copy = List(self.elements)
+        # Vectors are never changed in place, so copies share the array
+        copy = Vector(self.values)
         copy.set_pos(self.pos_start, self.pos_end)
         copy.set_context(self.context)
         return copy
 
     def __repr__(self):
-        return f'[{", ".join([str(x) for x in self.elements])}]'
+        return f'<{", ".join([str(x) for x in self.values])}>'
+
+
+def make_vector(values):
+    """
+    Raises OverflowError for integers that don't fit in 64 bits, rather than
+    storing them as inexact floats
+    """
+    values = list(values)
+    try:
+        return Vector(array("q", values))
+    except (TypeError, OverflowError):
+        if not any(type(value) is float for value in values):
+            raise OverflowError("Integer too large for a vector")
+        return Vector(array("d", values))
+
+
+class Map(Value):
+    """
+    Entries keyed on the memo_key of numbers and strings, the values that
+    never change, in insertion order. 1 and 1.0 print differently, so they
+    are different keys.
+    """
+
+    def __init__(self, entries):
+        super().__init__()
+        # memo_key -> (key, value)
+        self.entries = entries
+        # Set on a map and its copies while they still share one dict; the
+        # first of them to be mutated takes its own
+        self.shares_entries = False
+
+    def own_entries(self):
+        if self.shares_entries:
+            self.entries = dict(self.entries)
+            self.shares_entries = False
+        return self.entries
+
+    def key_error(self, key):
+        return RuntimeError(
+            key.pos_start,
+            key.pos_end,
+            "Map keys must be numbers or strings",
+            self.context,
+        )
+
+    def missing_key_error(self, key):
+        return RuntimeError(
+            key.pos_start, key.pos_end, f"Key not found: {key}", self.context
+        )
+
+    def put(self, key, value):
+        hash_key = key.memo_key()
+        if hash_key is None:
+            return self.key_error(key)
+        self.own_entries()[hash_key] = (key, value)
+        return None
+
+    def pop(self, key):
+        hash_key = key.memo_key()
+        if hash_key is None:
+            return None, self.key_error(key)
+        if hash_key not in self.entries:
+            return None, self.missing_key_error(key)
+        _, value = self.own_entries().pop(hash_key)
+        return value, None
+
+    def has(self, key):
+        hash_key = key.memo_key()
+        return hash_key is not None and hash_key in self.entries
+
+    def added_to(self, other):
+        if isinstance(other, Map):
+            return Map({**self.entries, **other.entries}), None
+        return None, Value.illegal_operation(self, other)
+
+    def subbed_by(self, other):
+        copy = Map(dict(self.entries))
+        _, error = copy.pop(other)
+        if error:
+            return None, error
+        return copy, None
+
+    def divided_by(self, other):
+        hash_key = other.memo_key()
+        if hash_key is None:
+            return None, self.key_error(other)
+        entry = self.entries.get(hash_key)
+        if entry is None:
+            return None, self.missing_key_error(other)
+        return entry[1], None
+
+    def length(self):
+        return len(self.entries)
+
+    def iterate(self):
+        # Iterates over the keys as they were when the loop started
+        self.shares_entries = True
+        return (key for key, _ in self.entries.values()), None
+
+    def copy(self):
+        copy = Map(self.entries)
+        copy.set_pos(self.pos_start, self.pos_end)
+        copy.set_context(self.context)
+        self.shares_entries = copy.shares_entries = True
+        return copy
+
+    def __repr__(self):
+        entries = ", ".join(f"{key}: {value}" for key, value in self.entries.values())
+        return f"{{{entries}}}"
+
+
+def make_map(pairs):
+    """The Map of a literal's (key, value) pairs, or an error for a bad key"""
+    map_ = Map({})
+    for key, value in pairs:
+        error = map_.put(key, value)
+        if error:
+            return None, error
+    return map_, None
+
+
+class StringBuilder(Value):
+    """Text added to in place with APPEND and joined once it is read"""
+
+    def __init__(self, pieces):
+        super().__init__()
+        # Shared by every copy, like the builder itself
+        self.pieces = pieces
+
+    def append(self, value):
+        self.pieces.append(str(value))
+
+    def is_true(self):
+        return any(self.pieces)
+
+    def copy(self):
+        copy = StringBuilder(self.pieces)
+        copy.set_pos(self.pos_start, self.pos_end)
+        copy.set_context(self.context)
+        return copy
+
+    def __repr__(self):
+        if len(self.pieces) > 1:
+            self.pieces[:] = ["".join(self.pieces)]
+        return self.pieces[0] if self.pieces else ""
 
 
 class BaseFunction(Value):
@@ -349,7 +985,6 @@ class BaseFunction(Value):
         for i in range(len(args)):
             arg_name = arg_names[i]
             arg_value = args[i]
-            arg_value.set_context(context)
             context.symbol_table.set(arg_name, arg_value)
 
     def check_populate_args(self, arg_names, args, context):
@@ -362,36 +997,122 @@ class BaseFunction(Value):
 
 
 class Function(BaseFunction):
-    def __init__(self, name, body_node, arg_names, should_auto_return):
+    def __init__(
+        self, name, body_node, arg_names, should_auto_return, code=None, memo=None
+    ):
         super().__init__(name)
         self.body_node = body_node
         self.arg_names = arg_names
         self.should_auto_return = should_auto_return
+        self.code = code
+        self.memo = memo
+
+    def generate_new_context(self):
+        slot_names = getattr(self.code, "slot_names", None)
+        if slot_names is None:
+            return super().generate_new_context()
+
+        return self.generate_slot_context(self.context, self.pos_start)
+
+    def generate_slot_context(self, caller_context, call_pos):
+        # Locals live in the slots, every other name in the caller's table
+        slot_names = self.code.slot_names
+        new_context = Context(self.name, caller_context, call_pos)
+        new_context.symbol_table = caller_context.symbol_table
+        new_context.slots = [None] * len(slot_names)
+        new_context.slot_names = slot_names
+        if not new_context.local_names.issuperset(slot_names):
+            new_context.local_names = new_context.local_names.union(slot_names)
+        return new_context
+
+    def generate_tail_context(self, caller_context):
+        slot_names = getattr(self.code, "slot_names", None)
+        if slot_names is not None or caller_context.slots is not None:
+            return self.generate_new_context()
+
+        # The caller's frame is finished, so rather than chaining below it
+        # the callee takes over its bindings and its parent. This keeps
+        # mutual tail recursion from growing the symbol table chain.
+        new_context = Context(
+            self.name, caller_context.parent, caller_context.parent_entry_pos
+        )
+        new_context.symbol_table = SymbolTable(caller_context.symbol_table.parent)
+        new_context.symbol_table.symbols = dict(caller_context.symbol_table.symbols)
+        return new_context
+
+    def populate_args(self, arg_names, args, context):
+        if context.slots is None:
+            return super().populate_args(arg_names, args, context)
+
+        slot_names = context.slot_names
+        for i in range(len(args)):
+            context.slots[slot_names[arg_names[i]]] = args[i]
 
     def execute(self, args):
-        res = RuntimeResult()
-        interpreter = Interpreter()
-        context = self.generate_new_context()
+        function = self
+        context = None
+        # Memo entries of this call and of the tail calls it turns into,
+        # which all return the same value
+        pending = []
 
-        res.register(self.check_populate_args(self.arg_names, args, context))
+        while True:
+            if function.memo is not None:
+                key = arguments_key(args)
+                if key is not None:
+                    value = function.memo.get(key)
+                    if value is not None:
+                        remember(pending, value)
+                        return RuntimeResult().success(value)
+                    pending.append((function.memo, key))
+
+            if context is None:
+                context = self.generate_new_context()
+
+            res = RuntimeResult()
+            res.register(
+                function.check_populate_args(function.arg_names, args, context)
+            )
 
-        if res.should_return():
-            return res
+            if res.should_return():
+                return res
 
-        value = res.register(interpreter.visit(self.body_node, context))
-        if res.should_return() and res.func_return_value == None:
-            return res
+            if function.code is not None:
+                value = res.register(function.code.run(context))
+            else:
+                value = res.register(Interpreter().visit(function.body_node, context))
+            if res.should_return() and res.func_return_value == None:
+                return res
 
-        ret_value = (
-            (value if self.should_auto_return else None)
-            or res.func_return_value
-            or Number.null
-        )
-        return res.success(ret_value)
+            ret_value = (
+                (value if function.should_auto_return else None)
+                or res.func_return_value
+                or Number.null
+            )
+            if not isinstance(ret_value, TailCall):
+                if pending:
+                    remember(pending, ret_value)
+                return res.success(ret_value)
+
+            # Run the call in tail position here instead of nesting another
+            # execute. A call back into the same function reuses its frame:
+            # names the callee has not bound yet still read the caller's
+            # values, just as they would through the parent context.
+            callee, args = ret_value.function, ret_value.args
+            is_same_function = (
+                callee.code is function.code and callee.body_node is function.body_node
+            )
+            if not is_same_function:
+                context = callee.generate_tail_context(context)
+            function = callee
 
     def copy(self):
         copy = Function(
-            self.name, self.body_node, self.arg_names, self.should_auto_return
+            self.name,
+            self.body_node,
+            self.arg_names,
+            self.should_auto_return,
+            self.code,
+            self.memo,
         )
         copy.set_context(self.context)
         copy.set_pos(self.pos_start, self.pos_end)
@@ -401,21 +1122,35 @@ class Function(BaseFunction):
         return f"<function {self.name}>"
 
 
+class TailCall:
+    """A call in tail position, left for Function.execute to make"""
+
+    def __init__(self, function, args):
+        self.function = function
+        self.args = args
+
+
 class BuiltInFunction(BaseFunction):
     def __init__(self, name):
         super().__init__(name)
 
     def execute(self, args):
         res = RuntimeResult()
-        context = self.generate_new_context()
         method_name = f"execute_{self.name}"
         method = getattr(self, method_name, self.no_visit_method)
 
-        res.register(self.check_populate_args(method.arg_names, args, context))
-
+        res.register(self.check_args(method.arg_names, args))
         if res.should_return():
             return res
 
+        return self.run_method(method, args)
+
+    def run_method(self, method, args):
+        # Calls the execute_* method once the arguments are known to fit
+        res = RuntimeResult()
+        context = self.generate_new_context()
+        self.populate_args(method.arg_names, args, context)
+
         return_value = res.register(method(context))
         if res.should_return():
             return res
@@ -498,7 +1233,7 @@ class BuiltInFunction(BaseFunction):
         list_ = context.symbol_table.get("list")
         value = context.symbol_table.get("value")
 
-        if not isinstance(list_, List):
+        if not isinstance(list_, (List, StringBuilder)):
             return RuntimeResult().failure(
                 RuntimeError(
                     self.pos_start,
@@ -508,7 +1243,7 @@ class BuiltInFunction(BaseFunction):
                 )
             )
 
-        list_.elements.append(value)
+        list_.append(value)
         return RuntimeResult().success(Number.null)
 
     execute_append.arg_names = ["list", "value"]
@@ -517,6 +1252,12 @@ class BuiltInFunction(BaseFunction):
         list_ = context.symbol_table.get("list")
         index = context.symbol_table.get("index")
 
+        if isinstance(list_, Map):
+            value, error = list_.pop(index)
+            if error:
+                return self.failure(error.details, context)
+            return RuntimeResult().success(value)
+
         if not isinstance(list_, List):
             return RuntimeResult().failure(
                 RuntimeError(
@@ -537,7 +1278,7 @@ class BuiltInFunction(BaseFunction):
             )
 
         try:
-            element = list_.elements.pop(index.value)
+            element = list_.pop(index.value)
         except:
             return RuntimeResult().failure(
                 RuntimeError(
@@ -574,14 +1315,14 @@ class BuiltInFunction(BaseFunction):
                 )
             )
 
-        listA.elements.extend(listB.elements)
+        listA.extend(listB.elements)
         return RuntimeResult().success(Number.null)
 
     execute_extend.arg_names = ["listA", "listB"]
 
     def execute_len(self, context):
         list_ = context.symbol_table.get("list")
-        if not isinstance(list_, list):
+        if not isinstance(list_, (List, Vector, Map, String)):
             return RuntimeResult().failure(
                 RuntimeError(
                     self.pos_start,
@@ -590,7 +1331,7 @@ class BuiltInFunction(BaseFunction):
                     context,
                 )
             )
-        return RuntimeResult().success(Number(len(list_.elements)))
+        return RuntimeResult().success(make_number(list_.length()))
 
     execute_len.arg_names = ["list"]
 
@@ -636,6 +1377,311 @@ class BuiltInFunction(BaseFunction):
 
     execute_run.arg_names = ["fn"]
 
+    def execute_cache_stats(self, context):
+        fn = context.symbol_table.get("fn")
+
+        if not isinstance(fn, Function) or fn.memo is None:
+            return RuntimeResult().failure(
+                RuntimeError(
+                    self.pos_start,
+                    self.pos_end,
+                    "Argument must be a memoized function",
+                    context,
+                )
+            )
+
+        stats = fn.memo.stats()
+        return RuntimeResult().success(
+            List(
+                [
+                    make_number(stats[name])
+                    for name in (
+                        "hits",
+                        "misses",
+                        "evictions",
+                        "expirations",
+                        "size",
+                        "maxsize",
+                    )
+                ]
+            )
+        )
+
+    execute_cache_stats.arg_names = ["fn"]
+
+    def failure(self, details, context):
+        return RuntimeResult().failure(
+            RuntimeError(self.pos_start, self.pos_end, details, context)
+        )
+
+    def number_values(self, list_):
+        # The Python numbers in a list or vector, or None if it holds
+        # anything else
+        if isinstance(list_, Vector):
+            return list_.values
+        if isinstance(list_, List):
+            elements = list_.elements
+            if all(isinstance(element, Number) for element in elements):
+                return [element.value for element in elements]
+        return None
+
+    def caller(self, fn):
+        # User functions called by a builtin run in the builtin's caller's
+        # context, as if called from there directly
+        callee = fn.copy().set_pos(self.pos_start, self.pos_end)
+        return callee.set_context(self.context)
+
+    def execute_vector(self, context):
+        list_ = context.symbol_table.get("list")
+        if isinstance(list_, Vector):
+            return RuntimeResult().success(list_)
+
+        values = self.number_values(list_)
+        if values is None:
+            return self.failure("Argument must be a list of numbers", context)
+
+        try:
+            vector = make_vector(values)
+        except OverflowError:
+            return self.failure("Number too large for a vector", context)
+        return RuntimeResult().success(vector)
+
+    execute_vector.arg_names = ["list"]
+
+    def range_arguments(self, context):
+        start = context.symbol_table.get("start")
+        end = context.symbol_table.get("end")
+        step = context.symbol_table.get("step")
+
+        if not all(isinstance(value, Number) for value in (start, end, step)):
+            return None, self.failure("Arguments must be numbers", context)
+        if step.value == 0:
+            return None, self.failure("Step must not be 0", context)
+        return (start.value, end.value, step.value), None
+
+    def execute_vrange(self, context):
+        arguments, failure = self.range_arguments(context)
+        if failure:
+            return failure
+
+        try:
+            vector = make_vector(for_range(*arguments))
+        except OverflowError:
+            return self.failure("Number too large for a vector", context)
+        return RuntimeResult().success(vector)
+
+    execute_vrange.arg_names = ["start", "end", "step"]
+
+    def execute_range(self, context):
+        arguments, failure = self.range_arguments(context)
+        if failure:
+            return failure
+        return RuntimeResult().success(lazy_list(*arguments, None, None))
+
+    execute_range.arg_names = ["start", "end", "step"]
+
+    def execute_sum(self, context):
+        values = self.number_values(context.symbol_table.get("list"))
+        if values is None:
+            return self.failure("Argument must be a list of numbers", context)
+        return RuntimeResult().success(make_number(sum(values)))
+
+    execute_sum.arg_names = ["list"]
+
+    def execute_min(self, context):
+        values = self.number_values(context.symbol_table.get("list"))
+        if values is None:
+            return self.failure("Argument must be a list of numbers", context)
+        if not values:
+            return self.failure("Argument must not be empty", context)
+        return RuntimeResult().success(make_number(min(values)))
+
+    execute_min.arg_names = ["list"]
+
+    def execute_max(self, context):
+        values = self.number_values(context.symbol_table.get("list"))
+        if values is None:
+            return self.failure("Argument must be a list of numbers", context)
+        if not values:
+            return self.failure("Argument must not be empty", context)
+        return RuntimeResult().success(make_number(max(values)))
+
+    execute_max.arg_names = ["list"]
+
+    def sort_keys(self, values, context):
+        # The Python values to sort by: all numbers or all strings
+        if all(isinstance(value, Number) for value in values) or all(
+            isinstance(value, String) for value in values
+        ):
+            return [value.value for value in values], None
+        return None, self.failure(
+            "Elements must be all numbers or all strings", context
+        )
+
+    def execute_sort(self, context):
+        list_ = context.symbol_table.get("list")
+        if isinstance(list_, Vector):
+            return RuntimeResult().success(
+                Vector(array(list_.values.typecode, sorted(list_.values)))
+            )
+        if not isinstance(list_, List):
+            return self.failure("Argument must be a list", context)
+
+        elements = list_.elements
+        keys, failure = self.sort_keys(elements, context)
+        if failure:
+            return failure
+        order = sorted(range(len(elements)), key=keys.__getitem__)
+        return RuntimeResult().success(List([elements[i] for i in order]))
+
+    execute_sort.arg_names = ["list"]
+
+    def execute_sort_by(self, context):
+        list_ = context.symbol_table.get("list")
+        fn = context.symbol_table.get("fn")
+        if not isinstance(list_, List):
+            return self.failure("First argument must be a list", context)
+        if not isinstance(fn, BaseFunction):
+            return self.failure("Second argument must be a function", context)
+
+        res = RuntimeResult()
+        callee = self.caller(fn)
+        # The key function could change the list while it runs
+        elements = list(list_.elements)
+        sort_values = []
+        for element in elements:
+            sort_values.append(res.register(callee.execute([element])))
+            if res.should_return():
+                return res
+
+        keys, failure = self.sort_keys(sort_values, context)
+        if failure:
+            return failure
+        order = sorted(range(len(elements)), key=keys.__getitem__)
+        return res.success(List([elements[i] for i in order]))
+
+    execute_sort_by.arg_names = ["list", "fn"]
+
+    def execute_map(self, context):
+        list_ = context.symbol_table.get("list")
+        fn = context.symbol_table.get("fn")
+        values, error = list_.iterate()
+        if error:
+            return self.failure("First argument must be a list", context)
+        if not isinstance(fn, BaseFunction):
+            return self.failure("Second argument must be a function", context)
+
+        res = RuntimeResult()
+        callee = self.caller(fn)
+        elements = []
+        for value in values:
+            elements.append(res.register(callee.execute([value])))
+            if res.should_return():
+                return res
+        return res.success(List(elements))
+
+    execute_map.arg_names = ["list", "fn"]
+
+    def execute_filter(self, context):
+        list_ = context.symbol_table.get("list")
+        fn = context.symbol_table.get("fn")
+        values, error = list_.iterate()
+        if error:
+            return self.failure("First argument must be a list", context)
+        if not isinstance(fn, BaseFunction):
+            return self.failure("Second argument must be a function", context)
+
+        res = RuntimeResult()
+        callee = self.caller(fn)
+        elements = []
+        for value in values:
+            is_kept = res.register(callee.execute([value]))
+            if res.should_return():
+                return res
+            if is_kept.is_true():
+                elements.append(value)
+        return res.success(List(elements))
+
+    execute_filter.arg_names = ["list", "fn"]
+
+    def execute_reduce(self, context):
+        list_ = context.symbol_table.get("list")
+        fn = context.symbol_table.get("fn")
+        values, error = list_.iterate()
+        if error:
+            return self.failure("First argument must be a list", context)
+        if not isinstance(fn, BaseFunction):
+            return self.failure("Second argument must be a function", context)
+
+        res = RuntimeResult()
+        callee = self.caller(fn)
+        result = context.symbol_table.get("initial")
+        for value in values:
+            result = res.register(callee.execute([result, value]))
+            if res.should_return():
+                return res
+        return res.success(result)
+
+    execute_reduce.arg_names = ["list", "fn", "initial"]
+
+    def execute_put(self, context):
+        map_ = context.symbol_table.get("map")
+        if not isinstance(map_, Map):
+            return self.failure("First argument must be a map", context)
+
+        error = map_.put(
+            context.symbol_table.get("key"), context.symbol_table.get("value")
+        )
+        if error:
+            return self.failure(error.details, context)
+        return RuntimeResult().success(Number.null)
+
+    execute_put.arg_names = ["map", "key", "value"]
+
+    def execute_has(self, context):
+        map_ = context.symbol_table.get("map")
+        if not isinstance(map_, Map):
+            return self.failure("First argument must be a map", context)
+
+        is_found = map_.has(context.symbol_table.get("key"))
+        return RuntimeResult().success(Number.true if is_found else Number.false)
+
+    execute_has.arg_names = ["map", "key"]
+
+    def execute_strbuilder(self, context):
+        return RuntimeResult().success(StringBuilder([]))
+
+    execute_strbuilder.arg_names = []
+
+    def execute_str(self, context):
+        return RuntimeResult().success(String(str(context.symbol_table.get("value"))))
+
+    execute_str.arg_names = ["value"]
+
+    def slice_argument(self, value, context):
+        result, error = value.sliced(
+            context.symbol_table.get("start"), context.symbol_table.get("end")
+        )
+        if error:
+            return self.failure(error.details, context)
+        return RuntimeResult().success(result)
+
+    def execute_slice(self, context):
+        list_ = context.symbol_table.get("list")
+        if not isinstance(list_, (List, String)):
+            return self.failure("First argument must be a list or a string", context)
+        return self.slice_argument(list_, context)
+
+    execute_slice.arg_names = ["list", "start", "end"]
+
+    def execute_substr(self, context):
+        string = context.symbol_table.get("string")
+        if not isinstance(string, String):
+            return self.failure("First argument must be a string", context)
+        return self.slice_argument(string, context)
+
+    execute_substr.arg_names = ["string", "start", "end"]
+
 
 BuiltInFunction.print = BuiltInFunction("print")
 BuiltInFunction.print_ret = BuiltInFunction("print_ret")
@@ -651,3 +1697,21 @@ BuiltInFunction.pop = BuiltInFunction("pop")
 BuiltInFunction.extend = BuiltInFunction("extend")
 BuiltInFunction.len = BuiltInFunction("len")
 BuiltInFunction.run = BuiltInFunction("run")
+BuiltInFunction.cache_stats = BuiltInFunction("cache_stats")
+BuiltInFunction.vector = BuiltInFunction("vector")
+BuiltInFunction.vrange = BuiltInFunction("vrange")
+BuiltInFunction.range = BuiltInFunction("range")
+BuiltInFunction.sum = BuiltInFunction("sum")
+BuiltInFunction.min = BuiltInFunction("min")
+BuiltInFunction.max = BuiltInFunction("max")
+BuiltInFunction.sort = BuiltInFunction("sort")
+BuiltInFunction.sort_by = BuiltInFunction("sort_by")
+BuiltInFunction.map = BuiltInFunction("map")
+BuiltInFunction.filter = BuiltInFunction("filter")
+BuiltInFunction.reduce = BuiltInFunction("reduce")
+BuiltInFunction.put = BuiltInFunction("put")
+BuiltInFunction.has = BuiltInFunction("has")
+BuiltInFunction.strbuilder = BuiltInFunction("strbuilder")
+BuiltInFunction.str = BuiltInFunction("str")
+BuiltInFunction.slice = BuiltInFunction("slice")
+BuiltInFunction.substr = BuiltInFunction("substr")
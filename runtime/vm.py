@@ -0,0 +1,469 @@
+from compiling.opcodes import *
+from errors.error import RuntimeError
+from runtime.interpreter import RuntimeResult, for_range
+from runtime.memo import arguments_key, remember
+import compiling.compiler as compiler
+import runtime.types as types
+import operator
+
+# Binary operations whose result for two Numbers only depends on their
+# Python values. A BINARY_OP that sees two Numbers is rewritten in place
+# into a BINARY_NUMBER running one of these. Division stays generic
+# because of its zero check.
+NUMBER_OPERATIONS = {
+    "added_to": operator.add,
+    "subbed_by": operator.sub,
+    "multiplied_by": operator.mul,
+    "powered_by": operator.pow,
+    "get_comparison_eq": lambda a, b: int(a == b),
+    "get_comparison_lt": lambda a, b: int(a < b),
+    "get_comparison_gt": lambda a, b: int(a > b),
+    "get_comparison_lte": lambda a, b: int(a <= b),
+    "get_comparison_gte": lambda a, b: int(a >= b),
+    "anded_by": lambda a, b: int(a and b),
+    "ored_by": lambda a, b: int(a or b),
+}
+
+# How a call site runs the callee it last saw
+CALL_FRAME = 0
+CALL_BUILTIN = 1
+CALL_GENERIC = 2
+
+
+class ElementEvaluator:
+    """
+    Computes the elements of a LazyList made by the VM, one at a time with
+    the code of the loop body, or all of them in one run of the code that
+    loops over the counter values
+    """
+
+    def __init__(self, element_code, elements_code):
+        self.element_code = element_code
+        self.elements_code = elements_code
+
+    def __call__(self, context):
+        return VM().run(self.element_code, context).value
+
+    def evaluate_all(self, context, counter):
+        symbols = context.symbol_table.symbols
+        symbols[compiler.COUNTER_NAME] = iter(counter)
+        try:
+            return VM().run(self.elements_code, context).value.elements
+        finally:
+            del symbols[compiler.COUNTER_NAME]
+
+
+class CallCache:
+    """
+    Monomorphic inline cache of a CALL or TAIL_CALL instruction. It keeps
+    what was learned about the last callee: whether it can run in a VM
+    frame with this many arguments, or which execute_* method of a builtin
+    it maps to. A different callee, such as after its name is reassigned,
+    refills the cache.
+    """
+
+    def __init__(self):
+        self.function = None
+        self.kind = CALL_GENERIC
+        self.callee = None
+        self.method = None
+
+    def fill(self, function, arg_count, pos_start, pos_end):
+        self.function = function
+        self.kind = CALL_GENERIC
+        self.callee = None
+        self.method = None
+
+        if isinstance(function, types.Function):
+            if (
+                isinstance(function.code, compiler.Code)
+                and len(function.arg_names) == arg_count
+            ):
+                self.kind = CALL_FRAME
+        elif isinstance(function, types.BuiltInFunction):
+            method = getattr(function, f"execute_{function.name}", None)
+            if method is not None and len(method.arg_names) == arg_count:
+                # Builtins report errors at their own position, so the site
+                # keeps a copy placed at the call
+                self.callee = function.copy().set_pos(pos_start, pos_end)
+                self.method = getattr(self.callee, method.__name__)
+                self.kind = CALL_BUILTIN
+
+    def __repr__(self):
+        return "<call cache>"
+
+
+class VM:
+    def run(self, code, context):
+        res = RuntimeResult()
+        instructions = code.instructions
+        local_names = context.local_names
+        symbol_table = context.symbol_table
+        slots = context.slots
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        pc = 0
+        # Callers suspended by calls into other compiled functions. Those
+        # calls switch frames here rather than recursing through
+        # Function.execute, so the depth of BASIC recursion is not limited
+        # by the Python stack. Each frame keeps the operand stack height at
+        # which its callee's values start, and the memo entries waiting for
+        # the running function's result.
+        frames = []
+        base = 0
+        pending = None
+        Number = types.Number
+        make_number = types.make_number
+
+        while True:
+            op, arg, pos_start, pos_end = instructions[pc]
+            pc += 1
+
+            if op == OP_LOAD_FAST:
+                value = slots[arg[0]]
+                if value is None:
+                    # Read before the local is assigned, so it still refers to
+                    # the binding visible from the calling context
+                    value = context.parent.lookup(arg[1])
+                    if value is None:
+                        return res.failure(
+                            RuntimeError(
+                                pos_start,
+                                pos_end,
+                                f"'{arg[1]}' is not defined",
+                                context,
+                            )
+                        )
+                push(value)
+
+            elif op == OP_LOAD_NAME:
+                if arg in local_names:
+                    value = context.lookup(arg)
+                else:
+                    value = symbol_table.get(arg)
+                if value is None:
+                    return res.failure(
+                        RuntimeError(
+                            pos_start, pos_end, f"'{arg}' is not defined", context
+                        )
+                    )
+                push(value)
+
+            elif op == OP_LOAD_NUMBER:
+                push(arg)
+
+            elif op == OP_BINARY_NUMBER:
+                right = pop()
+                left = stack[-1]
+                if type(left) is Number and type(right) is Number:
+                    stack[-1] = make_number(arg[1](left.value, right.value))
+                else:
+                    # Other operands turned up, so go back to the generic
+                    # instruction. It quickens again on the next two Numbers.
+                    instructions[pc - 1] = (OP_BINARY_OP, arg[0], pos_start, pos_end)
+                    result, error = getattr(left, arg[0])(right)
+                    if error:
+                        return res.failure(error.locate(pos_start, pos_end, context))
+                    stack[-1] = result
+
+            elif op == OP_BINARY_OP:
+                right = pop()
+                left = pop()
+                if (
+                    type(left) is Number
+                    and type(right) is Number
+                    and arg in NUMBER_OPERATIONS
+                ):
+                    instructions[pc - 1] = (
+                        OP_BINARY_NUMBER,
+                        (arg, NUMBER_OPERATIONS[arg]),
+                        pos_start,
+                        pos_end,
+                    )
+                result, error = getattr(left, arg)(right)
+                if error:
+                    return res.failure(error.locate(pos_start, pos_end, context))
+                push(result)
+
+            elif op == OP_JUMP_IF_FALSE:
+                if not pop().is_true():
+                    pc = arg
+
+            elif op == OP_CALL:
+                arg_count, cache = arg
+                if arg_count:
+                    args = stack[-arg_count:]
+                    del stack[-arg_count:]
+                else:
+                    args = []
+                value_to_call = pop()
+                if value_to_call is not cache.function:
+                    cache.fill(value_to_call, arg_count, pos_start, pos_end)
+
+                if cache.kind == CALL_FRAME:
+                    entry = None
+                    if value_to_call.memo is not None:
+                        key = arguments_key(args)
+                        if key is not None:
+                            value = value_to_call.memo.get(key)
+                            if value is not None:
+                                push(value)
+                                continue
+                            entry = (value_to_call.memo, key)
+                    frames.append((code, pc, context, base, pending))
+                    pending = None if entry is None else [entry]
+                    context = value_to_call.generate_slot_context(context, pos_start)
+                    value_to_call.populate_args(value_to_call.arg_names, args, context)
+                    code = value_to_call.code
+                    instructions = code.instructions
+                    local_names = context.local_names
+                    symbol_table = context.symbol_table
+                    slots = context.slots
+                    base = len(stack)
+                    pc = 0
+                    continue
+
+                if cache.kind == CALL_BUILTIN:
+                    callee = cache.callee.set_context(context)
+                    call_res = callee.run_method(cache.method, args)
+                else:
+                    callee = (
+                        value_to_call.copy()
+                        .set_pos(pos_start, pos_end)
+                        .set_context(context)
+                    )
+                    call_res = callee.execute(args)
+                if call_res.error:
+                    return res.failure(call_res.error)
+                push(call_res.value)
+
+            elif op == OP_TAIL_CALL:
+                arg_count, cache = arg
+                if arg_count:
+                    args = stack[-arg_count:]
+                    del stack[-arg_count:]
+                else:
+                    args = []
+                value_to_call = pop()
+                if value_to_call is not cache.function:
+                    cache.fill(value_to_call, arg_count, pos_start, pos_end)
+
+                if frames and cache.kind == CALL_FRAME:
+                    # The caller is suspended in this loop, so the callee
+                    # simply takes over the current frame
+                    if value_to_call.memo is not None:
+                        key = arguments_key(args)
+                        if key is not None:
+                            value = value_to_call.memo.get(key)
+                            if value is not None:
+                                # The return following the call hands it back
+                                push(value)
+                                continue
+                            if pending is None:
+                                pending = []
+                            pending.append((value_to_call.memo, key))
+                    if value_to_call.code is not code:
+                        context = value_to_call.generate_slot_context(
+                            context, pos_start
+                        )
+                    value_to_call.populate_args(value_to_call.arg_names, args, context)
+                    code = value_to_call.code
+                    instructions = code.instructions
+                    local_names = context.local_names
+                    symbol_table = context.symbol_table
+                    slots = context.slots
+                    del stack[base:]
+                    pc = 0
+                    continue
+
+                if cache.kind == CALL_BUILTIN:
+                    callee = cache.callee.set_context(context)
+                    call_res = callee.run_method(cache.method, args)
+                else:
+                    callee = (
+                        value_to_call.copy()
+                        .set_pos(pos_start, pos_end)
+                        .set_context(context)
+                    )
+                    if not frames and isinstance(callee, types.Function):
+                        push(types.TailCall(callee, args))
+                        continue
+                    call_res = callee.execute(args)
+                if call_res.error:
+                    return res.failure(call_res.error)
+                push(call_res.value)
+
+            elif op == OP_STORE_FAST:
+                slots[arg] = stack[-1]
+
+            elif op == OP_STORE_NAME:
+                symbol_table.set(arg, stack[-1])
+
+            elif op == OP_POP:
+                pop()
+
+            elif op == OP_FOR_ITER:
+                i = next(stack[-1], None)
+                if i is None:
+                    pc = arg[2]
+                elif arg[0] is not None:
+                    slots[arg[0]] = make_number(i)
+                else:
+                    symbol_table.symbols[arg[1]] = make_number(i)
+
+            elif op == OP_FOR_EACH_ITER:
+                value = next(stack[-1], None)
+                if value is None:
+                    pc = arg[2]
+                elif arg[0] is not None:
+                    slots[arg[0]] = value
+                else:
+                    symbol_table.symbols[arg[1]] = value
+
+            elif op == OP_JUMP:
+                pc = arg
+
+            elif op == OP_LIST_APPEND:
+                value = pop()
+                stack[-arg].append(value)
+
+            elif op == OP_RETURN_FUNC or op == OP_RETURN_VALUE:
+                value = pop()
+                if not frames:
+                    if op == OP_RETURN_FUNC:
+                        return res.success_return(value)
+                    return res.success(value)
+
+                # A function body only reaches RETURN_VALUE once its result
+                # is on the stack, so both opcodes hand the value back
+                if pending is not None:
+                    remember(pending, value)
+                del stack[base:]
+                code, pc, context, base, pending = frames.pop()
+                instructions = code.instructions
+                local_names = context.local_names
+                symbol_table = context.symbol_table
+                slots = context.slots
+                push(value)
+
+            elif op == OP_LOAD_STRING:
+                push(arg)
+
+            elif op == OP_LOAD_NULL:
+                push(Number.null)
+
+            elif op == OP_UNARY_MINUS:
+                number, error = pop().multiplied_by(-1)
+                if error:
+                    return res.failure(error.locate(pos_start, pos_end, context))
+                push(number)
+
+            elif op == OP_UNARY_NOT:
+                number, error = pop().notted()
+                if error:
+                    return res.failure(error.locate(pos_start, pos_end, context))
+                push(number)
+
+            elif op == OP_BUILD_LIST:
+                if arg:
+                    elements = stack[-arg:]
+                    del stack[-arg:]
+                else:
+                    elements = []
+                push(
+                    types.List(elements)
+                    .set_context(context)
+                    .set_pos(pos_start, pos_end)
+                )
+
+            elif op == OP_BUILD_MAP:
+                if arg:
+                    values = stack[-2 * arg :]
+                    del stack[-2 * arg :]
+                else:
+                    values = []
+                map_, error = types.make_map(zip(values[::2], values[1::2]))
+                if error:
+                    return res.failure(error.locate(pos_start, pos_end, context))
+                push(map_.set_context(context).set_pos(pos_start, pos_end))
+
+            elif op == OP_SLICE:
+                has_start, has_end = arg
+                end = pop() if has_end else None
+                start = pop() if has_start else None
+                result, error = pop().sliced(start, end)
+                if error:
+                    return res.failure(error.locate(pos_start, pos_end, context))
+                push(result)
+
+            elif op == OP_FOR_PREP:
+                step_value = pop()
+                end_value = pop()
+                start_value = pop()
+                counter = for_range(
+                    start_value.value, end_value.value, step_value.value
+                )
+                push(iter(counter))
+
+            elif op == OP_GET_ITER:
+                values, error = pop().iterate()
+                if error:
+                    return res.failure(error.locate(pos_start, pos_end, context))
+                push(values)
+
+            elif op == OP_LAZY_LIST:
+                step_value = pop()
+                end_value = pop()
+                start_value = pop()
+                slot, var_name, element_code, elements_code = arg
+                elements = types.lazy_list(
+                    start_value.value,
+                    end_value.value,
+                    step_value.value,
+                    var_name,
+                    ElementEvaluator(element_code, elements_code),
+                )
+                if elements.counter:
+                    last = make_number(elements.counter[-1])
+                    if slot is not None:
+                        slots[slot] = last
+                    else:
+                        symbol_table.symbols[var_name] = last
+                push(elements.set_context(context).set_pos(pos_start, pos_end))
+
+            elif op == OP_MAKE_FUNCTION:
+                (
+                    func_name,
+                    arg_names,
+                    func_code,
+                    should_auto_return,
+                    body_node,
+                    slot,
+                    memo,
+                ) = arg
+                func = (
+                    types.Function(
+                        func_name,
+                        body_node,
+                        arg_names,
+                        should_auto_return,
+                        func_code,
+                        memo,
+                    )
+                    .set_context(context)
+                    .set_pos(pos_start, pos_end)
+                )
+                if slot is not None:
+                    slots[slot] = func
+                elif func_name:
+                    symbol_table.set(func_name, func)
+                push(func)
+
+            elif op == OP_RETURN_NONE:
+                # Only emitted into the program's code, which never runs as
+                # a frame of a call
+                return res.success(None)
+
+            else:
+                raise Exception(f"Unknown opcode {op}")
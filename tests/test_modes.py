@@ -0,0 +1,56 @@
+"""
+Runs the same programs in every execution mode and checks that they agree.
+
+    python -m pytest tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from runtime import runner
+
+MODES = ["ast", "fast", "closure", "python", "vm"]
+
+
+def run_all(mode, *texts):
+    """Runs each text as its own program, like lines typed into the shell"""
+    for text in texts:
+        value, error = runner.run("<test>", text, mode=mode)
+        if error:
+            raise AssertionError(error.as_string())
+    return value
+
+
+class CrossModeTest(unittest.TestCase):
+    def assert_every_mode(self, expected, *texts):
+        for mode in MODES:
+            with self.subTest(mode=mode):
+                self.assertEqual(repr(run_all(mode, *texts)), expected)
+
+    def test_stray_break_and_continue_end_the_program(self):
+        self.assert_every_mode("None", "BREAK")
+        self.assert_every_mode("None", "VAR a = 1\nCONTINUE\nVAR a = 2")
+
+    def test_caller_locals_visible_across_programs(self):
+        self.assert_every_mode("[5]", "FUN g() -> x", "FUN f(x) -> g()", "f(5)")
+
+    def test_memoized_function_sees_names_rebound_later(self):
+        self.assert_every_mode(
+            "[<function c>, 100]",
+            "FUN a(n) -> n + 1\nFUN b(n) -> a(n)\nb(1)",
+            "FUN c(a) -> b(1)\nc(FUN (x) -> 100)",
+        )
+
+    def test_lazy_list_read_in_part_and_in_full(self):
+        self.assert_every_mode(
+            "[[0, 2, 4, 6, 8, 5, 6, 7, 8, 9], [6, 55, [4, 6], 10]]",
+            "VAR l = FOR i = 0 TO 10 THEN IF i < 5 THEN i * 2 ELSE i\n"
+            "[l / 3, SUM(l), l[2:4], LEN(l)]",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()